@@ -8,10 +8,16 @@ import webbrowser
 from PyQt5.QtWidgets import QMessageBox, QFileDialog, QApplication
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor
-from olive_table import merge_csv_files, authenticate_gsheets, upload_to_gsheets, set_column_order
-from auto_download import login_and_download
+from olive_table import merge_csv_files, authenticate_gsheets, set_column_order, report_base_name, ReportPipeline, TRANSFORM_PLAN
+from output_sinks import write_sinks, LOW_MEMORY_CHUNK_ROWS
+from auto_download import login_and_download, DownloadIncomplete, report_name, urls
+from folder_watcher import FolderWatcher
+from raw_archive import archive_snapshot
+from query_api import LEAD_STORE, DEFAULT_CSV
 from statistics_calculator import calculate_statistics
 from utils import resource_path
+from run_timing import RunTimer, PROCESS_STAGES, format_eta
+from memory_budget import MemoryBudgetExceeded, merge_estimate, payload_estimate
 
 
 async def start_download(app):
@@ -24,6 +30,10 @@ async def start_download(app):
     This function handles errors and updates the application's UI components like the progress bar and status labels.
     """
     await asyncio.sleep(0)
+    ticker = None
+    pipeline = None
+    # Wait for any running sync: both download into and merge the same data directory
+    await app.sync_lock.acquire()
     try:
         executor = ThreadPoolExecutor(max_workers=1)
         loop = asyncio.get_running_loop()
@@ -31,16 +41,25 @@ async def start_download(app):
         app.progressBar.setVisible(True)
         app.progressBar.setValue(0)
 
-        def update_message(progress=None):
-            """Update the status label and progress bar."""
-            if progress is not None:
-                app.progressBar.setValue(progress)
-            QApplication.processEvents() 
+        update_message = progress_updater(app)
+        # The download worker thread must not touch Qt widgets; its updates are handed to the event loop
+        threadsafe_update = lambda progress=None, eta=None: loop.call_soon_threadsafe(update_message, progress, eta)
 
-        app.clear_data_directory()
-        
-        await loop.run_in_executor(executor, lambda: login_and_download(update_message))
-        app.files = [os.path.join(app.data_directory, f) for f in os.listdir(app.data_directory) if os.path.isfile(os.path.join(app.data_directory, f))]
+        # Progress and ETA are predicted from the durations of previous runs
+        timer = RunTimer([f'download:{report_name(url)}' for url in urls] + PROCESS_STAGES, on_update=threadsafe_update)
+        ticker = loop.create_task(timer.tick())
+
+        # Each report is parsed as soon as it is downloaded, while the remaining reports keep downloading.
+        # Not in low-memory mode: the parsed reports would all be held until the merge takes them.
+        if not app.low_memory:
+            pipeline = ReportPipeline()
+
+        # The data directory is not cleared: the download job resumes from its journal and replaces each report on success
+        await loop.run_in_executor(executor, lambda: login_and_download(
+            threadsafe_update, download_directory=app.data_directory, allow_stale=app.allow_stale_reports,
+            on_report_ready=pipeline.submit if pipeline is not None else None, timer=timer
+        ))
+        app.files = [os.path.join(app.data_directory, f) for f in os.listdir(app.data_directory) if f.endswith('.csv')]
 
         await asyncio.sleep(1)
 
@@ -48,14 +67,37 @@ async def start_download(app):
         today_date = datetime.now().strftime("%d/%m/%Y")
         app.successLabel.setText(f"הנתונים מעודכנים מתאריך {start_date} עד {today_date}")
 
-        await process_files(app, update_message)
+        await _process_files(app, update_message, pipeline, timer)
         
+    except DownloadIncomplete as e:
+        QMessageBox.critical(app, 'שגיאה בהורדה', f'לא ניתן היה להוריד את הדוחות: {", ".join(e.reports)}. הורדה חוזרת תוריד רק את הדוחות החסרים.')
     except Exception as e:
         QMessageBox.critical(app, 'שגיאה בהורדה', f'אירעה שגיאה במהלך ההורדה: {str(e)}')
     finally:
+        if ticker is not None:
+            ticker.cancel()
+        if pipeline is not None:
+            pipeline.close()
+        app.sync_lock.release()
         app.progressBar.setVisible(False)  # Hide the progress bar when done
 
 
+def progress_updater(app):
+    """
+    Returns a callback that shows a progress percentage and, when known, the estimated time remaining.
+
+    Args:
+        app (QWidget): The main application instance holding the progress bar.
+    """
+    def update_message(progress=None, eta=None):
+        """Update the status label and progress bar."""
+        if progress is not None:
+            app.progressBar.setValue(progress)
+        app.progressBar.setFormat(f'%p%   {format_eta(eta)}' if eta else '%p%')
+        QApplication.processEvents()
+    return update_message
+
+
 async def upload_files(app):
     """
     Opens a file dialog to let the user select CSV files to upload, and copies these files to a designated data directory.
@@ -69,11 +111,13 @@ async def upload_files(app):
     options |= QFileDialog.DontUseNativeDialog
     files, _ = QFileDialog.getOpenFileNames(app, "Select one or more files to open", app.get_downloads_folder(), "CSV Files (*.csv)", options=options)
     if files:
-        app.clear_data_directory()
-        app.files = []
-        for file_path in files:
-            shutil.copy(file_path, app.data_directory)
-            app.files.append(os.path.join(app.data_directory, os.path.basename(file_path)))
+        # A watch-mode or download sync may be reading the data directory; replace it only after that sync
+        async with app.sync_lock:
+            app.clear_data_directory()
+            app.files = []
+            for file_path in files:
+                shutil.copy(file_path, app.data_directory)
+                app.files.append(os.path.join(app.data_directory, os.path.basename(file_path)))
         app.processButton.setEnabled(True)
         await asyncio.sleep(0)
         QMessageBox.information(app, 'קבצים נבחרו', f'הועתקו {len(app.files)} קבצים לתיקייה.')
@@ -98,45 +142,195 @@ async def display_summary(app):
     QMessageBox.information(app, 'הדפסה הושלמה', 'כעת תוכל לצפות בסיכומים')
 
 
-async def process_files(app, update_message=None):
+async def process_files(app, update_message=None, pipeline=None, timer=None):
     """
-    Processes selected files by merging, calculating statistics, and uploading them to Google Sheets.
+    Processes selected files by merging, calculating statistics, and writing them to the configured outputs (Google Sheets by default).
 
     Args:
         app (QWidget): The main application instance with access to app data and methods.
         update_message (Callable[[int], None]): Optional; A callback function to update the progress displayed to the user.
+        pipeline (ReportPipeline): Optional; A pipeline that has already been parsing the reports while they downloaded.
+        timer (RunTimer): Optional; The timer of the whole sync. When omitted, processing is timed on its own.
 
     Handles the full lifecycle of file processing from reading, merging, calculating statistics, and uploading to Google Sheets.
+    Runs after any sync already in progress, so two syncs never merge or upload at the same time.
     """
+    async with app.sync_lock:
+        await _process_files(app, update_message, pipeline, timer)
+
+
+async def _process_files(app, update_message=None, pipeline=None, timer=None):
+    # process_files without taking app.sync_lock, for callers that already hold it
     if not app.files:
         QMessageBox.critical(app, 'לא נבחרו קבצים', 'לא נבחרו קבצים לעיבוד.')
         return
-    
-    update_message(0)
-    merged_df = merge_csv_files(app.data_directory)
-    update_message(30)
-    if merged_df is not None:
-        update_message(50)
-        stats = await calculate_statistics(merged_df)
-        update_message(70)
-        gc = authenticate_gsheets(app.json_keyfile)
-        column_order = ['נוצר בתאריך', 'שם', 'טלפון', 'מקור', 'סטטוס', 'סיבות התנגדות', 'מפגש ניסיון', 'עשו ניסיון', 'רלוונטי','יש מנוי', 'מנוי', 'גיל', 'קובץ מקור']
-        final_df = set_column_order(merged_df, column_order)
-        update_message(95)
-        upload_to_gsheets(final_df, gc, app.sheet_url)
-        update_message(100)
-        app.statsText.setHtml(stats)
-    else:
-        QMessageBox.critical(app, 'שגיאה', 'נכשל בתהליך העיבוד וההעלאה של הקבצים.')
+
+    if update_message is None:
+        update_message = lambda progress=None, eta=None: None
+
+    loop = asyncio.get_running_loop()
+    owns_timer = timer is None
+    if owns_timer:
+        update_message(0)
+        timer = RunTimer(PROCESS_STAGES, on_update=update_message)
+    ticker = loop.create_task(timer.tick()) if owns_timer else None
+
+    low_memory = app.low_memory
+    budget = app.memory_budget
+    try:
+        # Keep the raw exports of every run; archiving runs alongside the merge, except in low-memory mode
+        # where its copy of each export would add to the merge's peak (and is not in merge_estimate)
+        archive = None if low_memory else loop.run_in_executor(None, archive_snapshot, app.data_directory)
+        input_size = sum(os.path.getsize(f) for f in app.files if os.path.exists(f))
+        budget.check('merge', merge_estimate(input_size, low_memory))
+        timer.start('merge', size=input_size)
+        if pipeline is not None:
+            merged_df = await loop.run_in_executor(None, lambda: pipeline.merge(app.data_directory, low_memory=low_memory))
+        else:
+            merged_df = await loop.run_in_executor(None, lambda: merge_csv_files(app.data_directory, low_memory=low_memory))
+        timer.finish('merge', record=merged_df is not None)
+        budget.report('merge')
+        record_parse_profile(timer, TRANSFORM_PLAN.take_profile())
+        if archive is None:
+            archive = loop.run_in_executor(None, archive_snapshot, app.data_directory)
+        try:
+            await archive
+        except Exception as e:
+            print(f'Failed to archive {app.data_directory}. Reason: {e}')
+        if merged_df is not None:
+            # Publish the new merge to the local query API when it runs (QUERY_API_PORT)
+            if app.query_server is not None and low_memory:
+                # The query API loads the merged CSV when it is queried instead of keeping its own copy of the leads
+                LEAD_STORE.follow(resource_path(DEFAULT_CSV))
+            elif app.query_server is not None:
+                # Replacing the leads also drops the cached responses
+                await loop.run_in_executor(None, LEAD_STORE.load, merged_df)
+            timer.start('statistics', size=len(merged_df))
+            stats = await calculate_statistics(merged_df)
+            timer.finish('statistics')
+            column_order = ['נוצר בתאריך', 'שם', 'טלפון', 'מקור', 'סטטוס', 'סיבות התנגדות', 'מפגש ניסיון', 'עשו ניסיון', 'רלוונטי','יש מנוי', 'מנוי', 'גיל', 'קובץ מקור', 'Cluster ID', 'Cluster Confidence']
+            final_df = set_column_order(merged_df, column_order)
+            del merged_df
+            # The same table goes to every configured output (Google Sheets by default), concurrently
+            chunk_rows = LOW_MEMORY_CHUNK_ROWS if low_memory else None
+            budget.check('upload', payload_estimate(len(final_df), len(final_df.columns), chunk_rows))
+            timer.start('upload', size=len(final_df))
+            results = await loop.run_in_executor(None, lambda: write_sinks(final_df, app.output_sinks, chunk_rows=chunk_rows))
+            failed = [result for result in results if result['error'] is not None]
+            timer.finish('upload', record=not failed)
+            budget.report('upload')
+            update_message(100)
+            app.statsText.setHtml(stats)
+            if failed:
+                details = '\n'.join(f"{result['sink']!r}: {result['error']}" for result in failed)
+                QMessageBox.warning(app, 'שגיאה בשמירה', f'הנתונים לא נשמרו בחלק מהיעדים:\n{details}')
+
+            anomalies = timer.close()
+            if anomalies:
+                slow = ', '.join(f"{a['stage']} ({a['seconds']:.0f}s, בדרך כלל {a['usual']:.0f}s)" for a in anomalies)
+                app.successLabel.setText(f'{app.successLabel.text()}\nהסנכרון איטי מהרגיל: {slow}'.strip())
+        else:
+            QMessageBox.critical(app, 'שגיאה', 'נכשל בתהליך העיבוד וההעלאה של הקבצים.')
+    except MemoryBudgetExceeded as e:
+        print(f'Stopped: {e}')
+        QMessageBox.critical(app, 'חריגה מתקציב הזיכרון', f'הסנכרון הופסק לפני שלב {e.stage}: נדרשים כ-{e.needed // 2**20} MB מתוך {e.budget // 2**20} MB.')
+    finally:
+        if ticker is not None:
+            ticker.cancel()
+
+
+def record_parse_profile(timer, profile):
+    """
+    Print one summary line of the reports parsed for a merge and add each to the run history as 'parse:<report>'.
+
+    Args:
+        timer (RunTimer): The timer of the sync.
+        profile (dict): Report name -> profile, as returned by TransformPlan.take_profile.
+    """
+    if not profile:
+        return
+    for name, report in profile.items():
+        timer.record(f'parse:{name}', report['read_seconds'] + report['transform_seconds'], report['rows_read'])
+    slowest = max(profile, key=lambda name: profile[name]['read_seconds'] + profile[name]['transform_seconds'])
+    print(
+        f"Parsed {len(profile)} reports: {sum(p['rows_read'] for p in profile.values())} rows read, "
+        f"{sum(p['rows_kept'] for p in profile.values())} kept, "
+        f"{sum(p['read_seconds'] for p in profile.values()):.2f}s reading, "
+        f"{sum(p['transform_seconds'] for p in profile.values()):.2f}s transforming (slowest: {slowest})"
+    )
 
 
-def open_sheet(app):
+async def ingest_reports(app, paths):
+    """
+    Copies newly exported reports into the data directory and runs an incremental merge and upload.
+
+    Args:
+        app (QWidget): The main application instance with access to app data and methods.
+        paths (list): Paths of report CSV files that finished downloading.
+
+    Each new report replaces the previous copy of the same report in the data directory; the other
+    reports are kept, and only the changed files are re-read by the merge.
+    """
+    loop = asyncio.get_running_loop()
+    # Exports saved during a running sync wait for it instead of replacing reports it is merging
+    await app.sync_lock.acquire()
+
+    def copy_reports():
+        for file_path in paths:
+            base_name = report_base_name(file_path)
+            for filename in os.listdir(app.data_directory):
+                if filename.endswith('.csv') and report_base_name(filename) == base_name:
+                    os.unlink(os.path.join(app.data_directory, filename))
+            shutil.copy(file_path, os.path.join(app.data_directory, base_name + '.csv'))
+
+    try:
+        await loop.run_in_executor(None, copy_reports)
+        app.files = [os.path.join(app.data_directory, f) for f in os.listdir(app.data_directory) if f.endswith('.csv')]
+        app.processButton.setEnabled(True)
+
+        app.progressBar.setVisible(True)
+        await _process_files(app, progress_updater(app))
+    finally:
+        app.sync_lock.release()
+        app.progressBar.setVisible(False)
+
+
+async def toggle_watch(app):
+    """
+    Starts or stops watch mode, which ingests new Arbox exports from the watch folder as soon as they are saved.
+
+    Args:
+        app (QWidget): The main application instance holding the watch folder and the current watcher.
+    """
+    if app.watcher is not None and app.watcher.running:
+        app.watcher.stop()
+        app.watcher = None
+        app.watchButton.setText('מעקב אחר הורדות')
+        app.successLabel.setText('')
+        return
+
+    app.watcher = FolderWatcher(app.watch_folder, lambda paths: ingest_reports(app, paths))
+    app.watcher.start()
+    app.watchButton.setText('עצור מעקב')
+    app.successLabel.setText(f'ממתין לדוחות חדשים בתיקייה {app.watch_folder}')
+
+
+async def open_sheet(app):
     """
     Opens the Google Sheets URL specified in the application's environment settings in the user's default web browser.
 
     Args:
         app (QWidget): The main application instance where the sheet URL is stored.
+
+    When the shared Sheets client has already looked up the worksheet, its direct URL is opened instead.
+    The configured URL is opened if the client cannot be created (e.g. a missing or invalid key file).
     """
-    webbrowser.open_new(app.sheet_url)
+    sheet_url = app.sheet_url
+    if app.json_keyfile:
+        try:
+            sheet_url = authenticate_gsheets(app.json_keyfile).worksheet_url(app.sheet_url)
+        except Exception as e:
+            print(f'Failed to create the Sheets client. Reason: {e}')
+    webbrowser.open_new(sheet_url)
 
 
@@ -11,8 +11,11 @@ from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 import time
 from datetime import datetime
+from urllib.parse import urlparse
 from dotenv import load_dotenv
 from utils import resource_path
+from olive_table import report_base_name
+from download_journal import DownloadJournal, file_hash, DOWNLOADING, DONE, FAILED
 
 
 load_dotenv(resource_path('.env'))
@@ -36,10 +39,29 @@ url_to_button_xpath = {
 
 urls = [url.format(start_date, today_date) for url in url_to_button_xpath.keys()]
 
-def setup_driver():
+DOWNLOAD_DIRECTORY = os.path.join(os.path.dirname(os.path.realpath(__file__)), "data")
+
+
+class DownloadIncomplete(Exception):
+    """Raised when some reports could not be downloaded after all retries."""
+
+    def __init__(self, reports):
+        self.reports = reports
+        super().__init__(f"Failed to download: {', '.join(reports)}")
+
+
+def report_name(url):
+    """Return the report name (and downloaded file name) of a report URL, e.g. 'all-leads-report'."""
+    return urlparse(url).path.rsplit('/', 1)[-1]
+
+
+def setup_driver(download_directory=DOWNLOAD_DIRECTORY):
     """
     Configures and returns a Selenium WebDriver with Chrome options set for headless operation.
 
+    Args:
+        download_directory (str): The directory Chrome saves the reports to.
+
     Returns:
         WebDriver: A configured instance of Chrome WebDriver with specified options for downloads and headless operation.
     """
@@ -49,9 +71,6 @@ def setup_driver():
     chrome_options.add_argument("--disable-gpu")  # For better compatibility on some systems
     chrome_options.add_argument("--no-sandbox")  # Useful for running in Docker or restricted environments
     chrome_options.add_argument("--disable-dev-shm-usage")  # Avoid resource issues in headless mode
-    current_directory = os.path.dirname(os.path.realpath(__file__))
-    download_directory = os.path.join(current_directory, "data")
-    
     # Ensure the download directory exists
     if not os.path.exists(download_directory):
         os.makedirs(download_directory)
@@ -141,30 +160,132 @@ def login(driver):
 
 
 
-def login_and_download(update_message=None):
+def wait_for_download(directory, name, since, timeout=60):
+    """
+    Waits until Chrome has finished saving a report started at ``since``.
+
+    Args:
+        directory (str): The download directory.
+        name (str): The report name the file is saved under.
+        since (float): Timestamp taken just before the download was started.
+        timeout (int): Seconds to wait before giving up.
+
+    Returns:
+        str: The file name of the downloaded report.
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        in_progress = any(f.endswith('.crdownload') for f in os.listdir(directory))
+        candidates = [
+            f for f in os.listdir(directory)
+            if f.endswith('.csv') and report_base_name(f) == name and os.path.getmtime(os.path.join(directory, f)) >= since - 1
+        ]
+        if candidates and not in_progress:
+            return max(candidates, key=lambda f: os.path.getmtime(os.path.join(directory, f)))
+        time.sleep(0.5)
+    raise TimeoutError(f'{name} was not downloaded within {timeout} seconds')
+
+
+def keep_only(directory, name, filename):
+    """Removes older copies of a report so only the newly downloaded file remains, saved under its plain name."""
+    for f in os.listdir(directory):
+        if f != filename and f.endswith('.csv') and report_base_name(f) == name:
+            os.unlink(os.path.join(directory, f))
+    if filename != f'{name}.csv':
+        os.replace(os.path.join(directory, filename), os.path.join(directory, f'{name}.csv'))
+        filename = f'{name}.csv'
+    return filename
+
+
+def login_and_download(update_message=None, download_directory=DOWNLOAD_DIRECTORY, allow_stale=False, max_attempts=3, backoff=2, on_report_ready=None, timer=None):
     """
     Manages the entire process of logging into the Arbox management system and downloading multiple reports.
 
+    Each report's progress is recorded in a download journal. Failed reports are retried with exponential
+    backoff, and a run that was interrupted is resumed by fetching only the reports that are missing.
+    Previously downloaded files are only replaced once a report downloads successfully.
+
     Args:
         update_message (callable, optional): A function to call with progress updates.
+        download_directory (str): The directory the reports are saved to.
+        allow_stale (bool): If True, reports that still fail keep their previous file instead of failing the run.
+        max_attempts (int): Attempts per report before it is marked as failed.
+        backoff (int): Seconds to wait before the first retry; doubled after each failed attempt.
+        on_report_ready (callable, optional): Called with the path of each report file as soon as it is available,
+            so it can be processed while the remaining reports download.
+        timer (RunTimer, optional): Records each report's download time ('download:<report>') and drives the
+            progress instead of the fixed per-report steps.
+
+    Raises:
+        DownloadIncomplete: Some reports failed and no usable previous file was allowed or present.
     """
-    driver = setup_driver()
-
-    try:
-        if update_message:
-            update_message(0)
-        login(driver)
-
-        for i, url in enumerate(urls, start=1):
-            if update_message:
-                update_message(i * (100 // len(urls)))
-            download_report(driver, url)
-            time.sleep(3)
-
-        if update_message:
-            update_message(100)
-    finally:
-        driver.quit()
+    os.makedirs(download_directory, exist_ok=True)
+    names = {report_name(url): url for url in urls}
+    journal = DownloadJournal(download_directory, f'{start_date}:{today_date}', list(names))
+    missing = journal.missing()
+    if not journal.resumed:
+        # Drop files that do not belong to any report; known reports stay as fallbacks until replaced
+        for f in os.listdir(download_directory):
+            if f.endswith('.csv') and report_base_name(f) not in names:
+                os.unlink(os.path.join(download_directory, f))
+
+    for name in names:
+        if name not in missing:
+            if timer:
+                timer.skip(f'download:{name}')
+            if on_report_ready:
+                on_report_ready(os.path.join(download_directory, journal.entry(name)['file']))
+
+    # With a timer, progress comes from the timer only
+    if timer:
+        update_message = None
+    if update_message:
+        update_message(0)
+    if missing:
+        driver = setup_driver(download_directory)
+        try:
+            login(driver)
+            done = len(names) - len(missing)
+            for name in missing:
+                if timer:
+                    timer.start(f'download:{name}')
+                for attempt in range(max_attempts):
+                    journal.mark(name, DOWNLOADING)
+                    try:
+                        started = time.time()
+                        download_report(driver, names[name])
+                        filename = keep_only(download_directory, name, wait_for_download(download_directory, name, started))
+                        journal.mark(name, DONE, file=filename, hash=file_hash(os.path.join(download_directory, filename)))
+                        if timer:
+                            timer.finish(f'download:{name}', size=os.path.getsize(os.path.join(download_directory, filename)))
+                        if on_report_ready:
+                            on_report_ready(os.path.join(download_directory, filename))
+                        break
+                    except Exception as e:
+                        journal.mark(name, FAILED, error=str(e))
+                        print(f'Failed to download {name} (attempt {attempt + 1}/{max_attempts}). Reason: {e}')
+                        if attempt + 1 < max_attempts:
+                            time.sleep(backoff * 2 ** attempt)
+                        elif timer:
+                            timer.finish(f'download:{name}', record=False)
+                done += 1
+                if update_message:
+                    update_message(done * (100 // len(names)))
+        finally:
+            driver.quit()
+
+    failed = journal.failed()
+    if failed:
+        stale_available = all(
+            any(f.endswith('.csv') and report_base_name(f) == name for f in os.listdir(download_directory))
+            for name in failed
+        )
+        if not (allow_stale and stale_available):
+            raise DownloadIncomplete(failed)
+        print(f"Continuing with previously downloaded files for: {', '.join(failed)}")
+
+    if update_message:
+        update_message(100)
 
 
 
@@ -0,0 +1,122 @@
+"""
+Scaling benchmark for the sharded merge (merge_reports with workers=1, 2, 4 and 8).
+
+Builds synthetic reports in memory, checks that every worker count returns exactly the
+single-process result and prints the time of each. Only the per-lead aggregation is sharded
+(aggregate_leads, or _parallel_aggregate with more than one worker), so that is what is timed;
+the whole single-process merge_reports, which also resolves identities and writes the CSV, is
+printed once for reference. Both process start paths are timed:
+
+- main thread: aggregation called from the only running thread, so workers are forked and
+  inherit the shards without copying (where the platform supports fork);
+- worker thread: aggregation called from a thread pool, as the app does (process_files runs the
+  merge in run_in_executor), so workers are spawned and every shard is pickled.
+
+Usage:
+    python benchmarks/bench_parallel_merge.py [--leads 200000] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from report_schemas import normalize_phone  # noqa: E402
+
+SOURCES = np.array(['Website', 'פייסבוק', 'ללא מקור', 'instagram', 'חבר'], dtype=object)
+STATUSES = np.array(['סומן כאבוד', 'חדש', 'בטיפול', None], dtype=object)
+SUBSCRIPTIONS = np.array(['חודשי', 'שנתי', 'ללא', 'מנוי פריסייל', 'כרטיסיה'], dtype=object)
+
+
+def synthetic_reports(leads, seed=0):
+    """Return (base_name, DataFrame) reports shaped like the output of read_report."""
+    rng = np.random.default_rng(seed)
+    phones = np.array(['05%08d' % n for n in rng.choice(10 ** 8, leads, replace=False)], dtype=object)
+    created = pd.Timestamp('2024-09-01') + pd.to_timedelta(rng.integers(0, 365, leads), unit='D')
+
+    def report(title, size, **columns):
+        rows = rng.integers(0, leads, size)
+        df = pd.DataFrame({'שם': phones[rows], 'טלפון': phones[rows]})
+        for name, make in columns.items():
+            df[name] = make(rows)
+        df['קובץ מקור'] = title
+        df['Normalized Phone'] = normalize_phone(df['טלפון'])
+        return df
+
+    def pick(values):
+        return lambda rows: values[rng.integers(0, len(values), len(rows))]
+
+    return [
+        ('all-leads-report', report('כל המתעניינים', leads, **{'נוצר בתאריך': lambda rows: created[rows], 'מקור': pick(SOURCES), 'סטטוס': pick(STATUSES)})),
+        ('lost-leads-report', report('מתעניינים אבודים', leads // 4, **{'נוצר בתאריך': lambda rows: created[rows], 'סטטוס': lambda rows: np.full(len(rows), 'סומן כאבוד', dtype=object)})),
+        ('trial-classes-report', report('שיעורי ניסיון', leads // 5, **{'מאמנים': pick(np.array(['דנה', 'רוני'], dtype=object))}).drop_duplicates('Normalized Phone')),
+        ('active-members-report', report('לקוחות פעילים', leads // 3, **{'גיל': lambda rows: rng.integers(8, 60, len(rows)).astype(float), 'חברות': pick(SUBSCRIPTIONS)})),
+        ('active-memberships-report', report('מנויים פעילים', leads // 3, **{'מנוי': pick(SUBSCRIPTIONS)})),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--leads', type=int, default=200_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    # merge_reports reads resource_fix.csv and writes sheets_data/ relative to the working directory
+    os.chdir(tempfile.mkdtemp())
+    pd.DataFrame({'שם': ['resource'], 'טלפון': ['52-0000000'], 'מקור': ['Website']}).to_csv('resource_fix.csv', index=False)
+
+    import olive_table
+
+    reports = synthetic_reports(args.leads)
+    rows = sum(len(df) for _, df in reports)
+    print(f'{args.leads} leads, {rows} report rows, {os.cpu_count()} CPUs')
+
+    started = time.perf_counter()
+    olive_table.merge_reports(reports)
+    print(f'whole merge, workers=1: {time.perf_counter() - started:.2f}s')
+
+    # The input of the aggregation step, built as merge_reports builds it
+    marked_phones = {column: set() for column in olive_table.TRANSFORM_PLAN.mark_columns()}
+    for base_name, df in reports:
+        marks = olive_table.TRANSFORM_PLAN.step(base_name).marks
+        if marks:
+            marked_phones[marks].update(df['Normalized Phone'])
+    merged_df = pd.concat([df for _, df in reports], ignore_index=True)
+
+    def aggregate(workers):
+        if workers > 1:
+            return olive_table._parallel_aggregate(merged_df, marked_phones, workers)
+        return olive_table.aggregate_leads(merged_df, marked_phones)
+
+    def from_main_thread(workers):
+        return aggregate(workers)
+
+    def from_worker_thread(workers):
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(aggregate, workers).result()
+
+    baseline = None
+    for path, merge in (('main thread', from_main_thread), ('worker thread', from_worker_thread)):
+        for workers in (1, 2, 4, 8):
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                result = merge(workers)
+                timings.append(time.perf_counter() - started)
+            if baseline is None:
+                baseline = result
+            else:
+                pd.testing.assert_frame_equal(result, baseline)
+            best = min(timings)
+            if workers == 1:
+                single = best
+            print(f'aggregation from {path}, workers={workers}: {best:.2f}s (speedup {single / best:.2f}x)')
+
+
+if __name__ == '__main__':
+    main()
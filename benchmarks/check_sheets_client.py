@@ -0,0 +1,101 @@
+"""
+Check that the shared SheetsClient fetches one access token for repeated calls and reuses its connection.
+
+Starts a local mock OAuth token endpoint and a mock API endpoint, points a client at them through
+the ``token_uri`` hook (the GSHEETS_TOKEN_URI setting of the app) with a throwaway service account
+key, makes several authorized requests and asserts that the token was fetched once, that every API
+request carried it and that all requests went over a single keep-alive connection.
+
+Usage:
+    python benchmarks/check_sheets_client.py [--calls 5]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import rsa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from olive_table import authenticate_gsheets  # noqa: E402
+
+
+class MockGoogle(BaseHTTPRequestHandler):
+    """POST /token issues a numbered access token; GET /api echoes the bearer token it was called with."""
+
+    protocol_version = 'HTTP/1.1'
+    token_requests = []
+    api_requests = []
+    connections = set()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.connections.add(self.client_address)
+        self.token_requests.append(self.path)
+        self._send({'access_token': f'token-{len(self.token_requests)}', 'expires_in': 3600, 'token_type': 'Bearer'})
+
+    def do_GET(self):
+        self.connections.add(self.client_address)
+        self.api_requests.append(self.headers.get('Authorization'))
+        self._send({'ok': True})
+
+    def _send(self, body):
+        body = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def service_account_key(path):
+    """Write a throwaway service account key file; its token_uri is replaced by the client's hook."""
+    _, private_key = rsa.newkeys(1024)
+    key = {
+        'type': 'service_account',
+        'project_id': 'mock',
+        'private_key_id': 'mock',
+        'private_key': private_key.save_pkcs1().decode('ascii'),
+        'client_email': 'mock@mock.iam.gserviceaccount.com',
+        'token_uri': 'https://oauth2.googleapis.com/token',
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(key, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=5)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockGoogle)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    keyfile = os.path.join(tempfile.mkdtemp(), 'service_account.json')
+    service_account_key(keyfile)
+
+    try:
+        client = authenticate_gsheets(keyfile, token_uri=f'{base_url}/token')
+        for _ in range(args.calls):
+            client.session.get(f'{base_url}/api').raise_for_status()
+        assert authenticate_gsheets(keyfile, token_uri=f'{base_url}/token') is client, 'the client is not shared'
+    finally:
+        server.shutdown()
+
+    print(
+        f'{args.calls} calls: {len(MockGoogle.token_requests)} token fetch(es), '
+        f'{len(MockGoogle.connections)} connection(s)'
+    )
+    assert len(MockGoogle.token_requests) == 1, 'the access token was not reused'
+    assert MockGoogle.api_requests == ['Bearer token-1'] * args.calls, 'a request was not authorized with the cached token'
+    assert len(MockGoogle.connections) == 1, 'the connection was not kept alive'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+
+PENDING = 'pending'
+DOWNLOADING = 'downloading'
+DONE = 'done'
+FAILED = 'failed'
+
+JOURNAL_FILE = 'download_journal.json'
+
+
+def file_hash(path):
+    """Return the SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DownloadJournal:
+    """
+    Records the state of every report of a download job so an interrupted run can be resumed.
+
+    The journal is a small JSON file in the download directory. Each report is pending, downloading,
+    done (with its file name and hash) or failed (with the last error and the number of attempts).
+    A job is identified by its key (the report date range); opening the journal with a different key,
+    or after the previous job completed, starts a new job in which every report is pending again.
+
+    Args:
+        directory (str): The download directory holding the journal and the report files.
+        job_key (str): Identifies the job; a journal from another job is not resumed.
+        reports (list): Names of the reports the job downloads.
+    """
+
+    def __init__(self, directory, job_key, reports):
+        self.directory = directory
+        self.path = os.path.join(directory, JOURNAL_FILE)
+        self.job_key = job_key
+        self.data = self._load()
+
+        resumable = self.data.get('job_key') == job_key and not self._complete(reports)
+        if not resumable:
+            self.data = {'job_key': job_key, 'started_at': datetime.now().isoformat(), 'reports': {}}
+        for report in reports:
+            entry = self.data['reports'].setdefault(report, {'state': PENDING, 'attempts': 0})
+            # A download that was interrupted mid-way, or whose file is gone or changed, has to be fetched again
+            if entry['state'] == DOWNLOADING or (entry['state'] == DONE and not self._file_intact(entry)):
+                entry.update(state=PENDING, attempts=0)
+        self.resumed = resumable
+        self.save()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _complete(self, reports):
+        entries = self.data.get('reports', {})
+        return all(entries.get(report, {}).get('state') == DONE for report in reports)
+
+    def _file_intact(self, entry):
+        path = os.path.join(self.directory, entry.get('file') or '')
+        return os.path.isfile(path) and file_hash(path) == entry.get('hash')
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def state(self, report):
+        return self.data['reports'][report]['state']
+
+    def entry(self, report):
+        return self.data['reports'][report]
+
+    def mark(self, report, state, **fields):
+        """Record a report's new state (and any extra fields such as file, hash or error) and persist it."""
+        entry = self.data['reports'][report]
+        if state == DOWNLOADING:
+            entry['attempts'] = entry.get('attempts', 0) + 1
+        entry.update(fields, state=state, updated_at=datetime.now().isoformat())
+        if state == DONE:
+            entry.pop('error', None)
+        self.save()
+
+    def missing(self):
+        """Return the reports that are not downloaded yet, in job order."""
+        return [report for report, entry in self.data['reports'].items() if entry['state'] != DONE]
+
+    def failed(self):
+        return [report for report, entry in self.data['reports'].items() if entry['state'] == FAILED]
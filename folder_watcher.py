@@ -0,0 +1,95 @@
+import asyncio
+import os
+import time
+from olive_table import report_type
+
+
+class FolderWatcher:
+    """
+    Watches a folder for new Arbox report exports and hands them over once they are fully written.
+
+    The folder is polled from the asyncio event loop (directory scans run in the default executor),
+    so watching never blocks the GUI. A file is considered complete once its size and modification
+    time have not changed for ``settle_seconds``, which debounces browsers that write an export in
+    several chunks. Files that already exist when watching starts are ignored.
+
+    Args:
+        folder (str): The folder to watch, e.g. the user's Downloads folder.
+        on_reports (Callable[[list], Awaitable]): Coroutine function called with the paths of newly completed reports.
+        poll_interval (float): Seconds between folder scans.
+        settle_seconds (float): Seconds a file must stay unchanged before it is reported.
+    """
+
+    def __init__(self, folder, on_reports, poll_interval=1.0, settle_seconds=2.0):
+        self.folder = folder
+        self.on_reports = on_reports
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self._seen = {}
+        self._pending = {}
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start watching on the running event loop."""
+        if not self.running:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        """Stop watching. Reports that are still settling are dropped."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._pending.clear()
+
+    def _scan(self):
+        """Return {path: (size, mtime_ns)} for every known report export in the folder."""
+        snapshot = {}
+        try:
+            entries = list(os.scandir(self.folder))
+        except FileNotFoundError:
+            return snapshot
+        for entry in entries:
+            if not entry.is_file() or report_type(entry.name) is None:
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            snapshot[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def _settled(self, snapshot):
+        """Return the paths that changed since they were last reported and have stopped changing."""
+        now = time.monotonic()
+        ready = []
+        for path, signature in snapshot.items():
+            if self._seen.get(path) == signature:
+                continue
+            pending = self._pending.get(path)
+            if pending is None or pending[0] != signature:
+                self._pending[path] = (signature, now)
+            elif signature[0] > 0 and now - pending[1] >= self.settle_seconds:
+                del self._pending[path]
+                self._seen[path] = signature
+                ready.append(path)
+
+        for path in [path for path in self._pending if path not in snapshot]:
+            del self._pending[path]
+        return ready
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        self._seen = await loop.run_in_executor(None, self._scan)
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            snapshot = await loop.run_in_executor(None, self._scan)
+            ready = self._settled(snapshot)
+            if ready:
+                try:
+                    await self.on_reports(sorted(ready))
+                except Exception as e:
+                    print(f'Failed to ingest {ready}. Reason: {e}')
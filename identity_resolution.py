@@ -0,0 +1,198 @@
+import re
+import unicodedata
+from difflib import SequenceMatcher
+import numpy as np
+import pandas as pd
+
+# Blocks larger than this (very common names) are skipped, keeping candidate generation close to linear
+MAX_BLOCK_SIZE = 50
+# Minimum score for two records to be linked
+LINK_THRESHOLD = 0.6
+# Leads matched on name alone must also share a source and have been created within this many days of each other
+NAME_ONLY_MAX_DAYS = 30
+
+HEBREW_FINAL_LETTERS = str.maketrans('ךםןףץ', 'כמנפצ')
+# Letters dropped from the phonetic key: Hebrew matres lectionis and guttural, English vowels
+PHONETIC_DROP = re.compile(r'[אהויעaeiouy]')
+
+
+def normalize_name(name):
+    """Return a comparable form of a Hebrew or English name: no niqqud or punctuation, lowercase, tokens sorted."""
+    name = unicodedata.normalize('NFKD', str(name))
+    name = ''.join(ch for ch in name if not unicodedata.combining(ch))
+    name = name.lower().translate(HEBREW_FINAL_LETTERS)
+    tokens = re.findall(r'[\w]+', name)
+    return ' '.join(sorted(token for token in tokens if not token.isdigit()))
+
+
+def phonetic_key(normalized_name):
+    """Return a coarse sound-alike key, so spelling variants of a name share a block."""
+    return ' '.join(PHONETIC_DROP.sub('', token) or token for token in normalized_name.split())
+
+
+def normalize_phone_number(phone):
+    """Return a phone as local digits, e.g. '+972 52-123-4567' -> '0521234567'."""
+    digits = re.sub(r'\D', '', str(phone))
+    if digits.startswith('972'):
+        digits = '0' + digits[3:]
+    elif digits and not digits.startswith('0'):
+        digits = '0' + digits
+    return digits
+
+
+def _variants(value, normalize):
+    if not isinstance(value, str) or not value.strip():
+        return []
+    return sorted({v for v in (normalize(part) for part in value.split(',')) if v})
+
+
+def _phone_keys(phone):
+    # Deletion neighbourhood of the subscriber digits: phones that differ in one of those digits share a key
+    tail = phone[-7:]
+    return [f'p{i}:{tail[:i]}_{tail[i + 1:]}' for i in range(len(tail))]
+
+
+def _phone_similarity(phones_a, phones_b):
+    best = 0.0
+    for a in phones_a:
+        for b in phones_b:
+            if a == b:
+                return 1.0
+            if len(a) == len(b):
+                diff = [i for i in range(len(a)) if a[i] != b[i]]
+                if len(diff) == 1:
+                    best = max(best, 0.9)
+                elif len(diff) == 2 and diff[1] == diff[0] + 1 and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]:
+                    best = max(best, 0.9)
+    return best
+
+
+def _name_similarity(names_a, names_b, minimum):
+    # Returns 0 as soon as the cheap upper bounds show the pair cannot reach ``minimum``
+    best = 0.0
+    for a in names_a:
+        for b in names_b:
+            matcher = SequenceMatcher(None, a, b)
+            if matcher.real_quick_ratio() < minimum or matcher.quick_ratio() < minimum:
+                continue
+            best = max(best, matcher.ratio())
+    return best if best >= minimum else 0.0
+
+
+def _created_together(day_a, day_b, sources_a, sources_b):
+    # The second signal a name-only match needs: created on the same day, or close together from the same source.
+    # Leads without a source ('ללא מקור') share none, so for them only the same day counts
+    if day_a is None or day_b is None:
+        return False
+    return day_a == day_b or (abs(day_a - day_b) <= NAME_ONLY_MAX_DAYS and bool(set(sources_a) & set(sources_b)))
+
+
+def _score(phones_a, phones_b, names_a, names_b, day_a=None, day_b=None, sources_a=(), sources_b=()):
+    """Return the link confidence of two records, or 0 if they should not be linked."""
+    if not names_a or not names_b:
+        return 0.0
+    phone = _phone_similarity(phones_a, phones_b)
+    if phone >= 0.9:
+        # Same person, phone typed with one digit wrong or two swapped
+        name = _name_similarity(names_a, names_b, 0.75)
+        return 0.6 * phone + 0.4 * name if name else 0.0
+    if min(len(n.split()) for n in names_a + names_b) >= 2 and _created_together(day_a, day_b, sources_a, sources_b):
+        # Same full name re-registered with another number; a shared name alone is common enough among
+        # members that it is never linked without the second signal
+        return 0.7 * _name_similarity(names_a, names_b, 0.92)
+    return 0.0
+
+
+def _normalize_source(source):
+    source = source.strip().lower()
+    return '' if source == 'ללא מקור' else source
+
+
+def _candidate_pairs(keys, records):
+    """Return the unique (i, j) record pairs, i < j, that share a blocking key."""
+    codes = pd.factorize(pd.Series(keys, dtype=object))[0]
+    records = np.asarray(records)
+    sizes = np.bincount(codes)
+    keep = (sizes[codes] >= 2) & (sizes[codes] <= MAX_BLOCK_SIZE)
+    codes, records = codes[keep], records[keep]
+    order = np.argsort(codes, kind='stable')
+    codes, records = codes[order], records[order]
+
+    pairs = set()
+    for block in np.split(records, np.flatnonzero(np.diff(codes)) + 1):
+        block = sorted(set(block.tolist()))
+        for a in range(len(block)):
+            for b in range(a + 1, len(block)):
+                pairs.add((block[a], block[b]))
+    return pairs
+
+
+def resolve_identities(df, phone_column='טלפון', name_column='שם', inplace=False,
+                       date_column='נוצר בתאריך', source_column='מקור'):
+    """
+    Link merged leads that belong to the same person.
+
+    Records are compared only within blocks that share a key: a one-digit-deletion key of the phone's
+    subscriber digits, the normalized name, or its phonetic key. Records with near-identical phones
+    and similar names are linked; records that only share a full name are linked when they were also
+    created on the same day, or within NAME_ONLY_MAX_DAYS days from the same source. A lead without a
+    source ('ללא מקור') is therefore linked by name only to leads created on the same day. Linked records
+    are grouped into clusters with union-find.
+
+    Args:
+        df (DataFrame): The merged leads (one row per normalized phone).
+        phone_column (str): Column holding the phone number(s), comma separated.
+        name_column (str): Column holding the name(s), comma separated.
+        inplace (bool): Optional; Add the columns to ``df`` itself instead of a copy.
+        date_column (str): Optional; Column holding the lead's creation date.
+        source_column (str): Optional; Column holding the source(s), comma separated.
+
+    Returns:
+        DataFrame: ``df`` or a copy of it with 'Cluster ID' (shared by linked leads) and 'Cluster Confidence'
+        (1.0 for leads that were not linked, otherwise the score of their strongest link).
+    """
+    phones = [_variants(value, normalize_phone_number) for value in df[phone_column]]
+    names = [_variants(value, normalize_name) for value in df[name_column]] if name_column in df.columns else [[] for _ in phones]
+    sources = [_variants(value, _normalize_source) for value in df[source_column]] if source_column in df.columns else [[] for _ in phones]
+    if date_column in df.columns:
+        created = pd.to_datetime(df[date_column], format='%d/%m/%Y', errors='coerce')
+        day_numbers = created.to_numpy(dtype='datetime64[D]').astype('int64')
+        days = [None if missing else int(day) for day, missing in zip(day_numbers, created.isna())]
+    else:
+        days = [None] * len(phones)
+
+    keys, records = [], []
+    for record, (record_phones, record_names) in enumerate(zip(phones, names)):
+        record_keys = [key for phone in record_phones for key in _phone_keys(phone)]
+        for name in record_names:
+            record_keys.append('n:' + name)
+            record_keys.append('s:' + phonetic_key(name))
+        keys.extend(record_keys)
+        records.extend([record] * len(record_keys))
+
+    parent = np.arange(len(df))
+    confidence = np.ones(len(df))
+    linked = np.zeros(len(df), dtype=bool)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in _candidate_pairs(keys, records):
+        score = _score(phones[a], phones[b], names[a], names[b], days[a], days[b], sources[a], sources[b])
+        if score < LINK_THRESHOLD:
+            continue
+        for record in (a, b):
+            confidence[record] = score if not linked[record] else max(confidence[record], score)
+            linked[record] = True
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    roots = np.array([find(i) for i in range(len(df))])
+    result = df if inplace else df.copy()
+    result['Cluster ID'] = pd.factorize(roots)[0]
+    result['Cluster Confidence'] = confidence.round(3)
+    return result
@@ -1,19 +1,23 @@
 import sys
 import os
+import multiprocessing
 # os.environ["QT_QPA_PLATFORM"] = "xcb"
 import shutil
 # from pathlib import Path
 # import webbrowser
 # import pandas as pd
-from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QTextEdit, QSizePolicy, QProgressBar
+from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QTextEdit, QSizePolicy, QProgressBar, QMessageBox
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QIcon, QPixmap, QFont, QFontDatabase
 from dotenv import load_dotenv
 from qasync import QEventLoop
 import asyncio
-# from olive_table import authenticate_gsheets, upload_to_gsheets, set_column_order
+# from olive_table import authenticate_gsheets, set_column_order
 # from statistics_calculator import calculate_statistics
 import app_functions
+import query_api
+from memory_budget import MemoryBudget
+from output_sinks import configured_sinks, GoogleSheetsSink
 from utils import resource_path
 
 
@@ -23,6 +27,21 @@ class CSVUploaderApp(QWidget):
         load_dotenv(resource_path('.env'))
         self.json_keyfile = os.getenv('JSON_KEYFILE')
         self.sheet_url = os.getenv('SHEET_URL')
+        # Outputs every sync writes to, e.g. 'sheets,csv,sqlite:exports/leads.db' (see output_sinks.configured_sinks)
+        try:
+            self.output_sinks = configured_sinks(os.getenv('OUTPUT_SINKS', 'sheets'), self.json_keyfile, self.sheet_url)
+        except ValueError as e:
+            QMessageBox.critical(self, 'שגיאה בהגדרות', f'OUTPUT_SINKS אינו תקין ({e}). הנתונים יועלו ל-Google Sheets בלבד.')
+            self.output_sinks = [GoogleSheetsSink(self.json_keyfile, self.sheet_url)]
+        # Low-memory mode trades some speed for a lower peak; MEMORY_BUDGET_MB stops a sync that would go over it
+        self.low_memory = os.getenv('LOW_MEMORY', '').lower() in ('1', 'true', 'yes')
+        self.memory_budget = MemoryBudget.from_env()
+        self.watch_folder = os.getenv('WATCH_FOLDER') or self.get_downloads_folder()
+        self.watcher = None
+        # Held by the running download, process or watch-mode sync; the others wait for it
+        self.sync_lock = asyncio.Lock()
+        self.allow_stale_reports = os.getenv('ALLOW_STALE_REPORTS', '').lower() in ('1', 'true', 'yes')
+        self.query_server = self.start_query_server(os.getenv('QUERY_API_PORT'))
         font_id = QFontDatabase.addApplicationFont(resource_path("VarelaRound-Regular.ttf"))
         self.font_name = QFontDatabase.applicationFontFamilies(font_id)[0]
         self.setFont(QFont(self.font_name))
@@ -81,6 +100,7 @@ class CSVUploaderApp(QWidget):
         self.uploadButton = QPushButton('בחירת קבצים', self)
         self.processButton = QPushButton('Google Sheets - העלה ל', self)
         self.openSheetButton = QPushButton('Google Sheets - פתח את', self)
+        self.watchButton = QPushButton('מעקב אחר הורדות', self)
         self.processButton.setEnabled(False)
         self.openSheetButton.setEnabled(True)
         buttonLayout.addWidget(self.showSummaryButton)
@@ -88,6 +108,7 @@ class CSVUploaderApp(QWidget):
         buttonLayout.addWidget(self.processButton)
         buttonLayout.addWidget(self.uploadButton)
         buttonLayout.addWidget(self.openSheetButton)
+        buttonLayout.addWidget(self.watchButton)
         mainLayout.addLayout(buttonLayout)
 
         # Success label
@@ -135,6 +156,7 @@ class CSVUploaderApp(QWidget):
         self.uploadButton.clicked.connect(self.wrap_async(app_functions.upload_files))
         self.processButton.clicked.connect(self.wrap_async(app_functions.process_files))
         self.openSheetButton.clicked.connect(self.wrap_async(app_functions.open_sheet))
+        self.watchButton.clicked.connect(self.wrap_async(app_functions.toggle_watch))
 
         # Initialize data directory and file list
         self.data_directory = self.ensure_data_directory_exists()
@@ -161,6 +183,16 @@ class CSVUploaderApp(QWidget):
         home = os.path.expanduser("~")
         return os.path.join(home, 'Downloads')
 
+    @staticmethod
+    def start_query_server(port):
+        """Start the local query API when QUERY_API_PORT is configured, serving the last merge until a new one runs."""
+        if not port:
+            return None
+        merged_csv = resource_path(query_api.DEFAULT_CSV)
+        if os.path.exists(merged_csv):
+            query_api.LEAD_STORE.load_csv(merged_csv)
+        return query_api.start_query_server(port=int(port))
+
     def ensure_data_directory_exists(self):
         data_directory = resource_path('data')
         if not os.path.exists(data_directory):
@@ -179,6 +211,8 @@ class CSVUploaderApp(QWidget):
                 print(f'Failed to delete {file_path}. Reason: {e}')
 
 if __name__ == "__main__":
+    # Needed for the merge worker processes in the bundled (PyInstaller) build
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     loop = QEventLoop(app)
     asyncio.set_event_loop(loop)
@@ -2,11 +2,19 @@ import pandas as pd
 import numpy as np
 import gspread
 from pathlib import Path
-from oauth2client.service_account import ServiceAccountCredentials
+from google.oauth2.service_account import Credentials
+from google.auth.transport.requests import AuthorizedSession, Request
+from requests.adapters import HTTPAdapter
+import requests
 import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait
+import multiprocessing
 from dotenv import load_dotenv
 import re
+from report_schemas import REPORT_SCHEMAS, TransformPlan, DATE_FORMAT, normalize_phone
+from identity_resolution import resolve_identities
 
 load_dotenv()
 
@@ -21,7 +29,8 @@ def set_column_order(df, column_order):
     Returns:
         DataFrame: A new DataFrame with columns ordered as specified.
     """
-    reordered_df = df[column_order] if all(col in df.columns for col in column_order) else df
+    # reindex rather than df[column_order]: the result is not a slice of df, so it can be modified in place
+    reordered_df = df.reindex(columns=column_order) if all(col in df.columns for col in column_order) else df
     
     return reordered_df
 
@@ -46,49 +55,148 @@ def resource_path(relative_path):
         return os.path.join(base_path, relative_path)
 
 
-def merge_csv_files(directory):
+# Compiled once from the report registry and shared by every merge
+TRANSFORM_PLAN = TransformPlan()
+FILES_TRANSLATE = {name: schema['title'] for name, schema in REPORT_SCHEMAS.items()}
+# Hash partitions aggregated one after another in low-memory mode
+LOW_MEMORY_CHUNKS = 8
+
+
+def report_base_name(file):
+    """Return the report name of an export file, without the ' (1)' suffix added by the browser."""
+    return re.sub(r'(\s+\(\d+\))$', '', Path(file).stem)
+
+
+def report_type(file):
+    """Return the Arbox report name for a CSV export, or None if the file is not a known report."""
+    if Path(file).suffix.lower() != '.csv':
+        return None
+    base_name = report_base_name(file)
+    return base_name if base_name in FILES_TRANSLATE else None
+
+
+# Parsed reports keyed by path, reused while the file's size and mtime are unchanged
+_report_cache = {}
+_report_cache_lock = threading.Lock()
+
+
+def read_report(file):
+    """
+    Read a single report file and apply its per-report step from the transform plan.
+
+    Results are cached by path, size and modification time, so a merge after one new export
+    only re-reads that file. The returned DataFrame is shared and must not be modified.
+
+    Returns:
+        tuple: The report base name and its DataFrame.
+    """
+    file = Path(file)
+    stat = file.stat()
+    signature = (stat.st_size, stat.st_mtime_ns)
+    with _report_cache_lock:
+        cached = _report_cache.get(str(file))
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    base_name = report_base_name(file)
+    df = TRANSFORM_PLAN.run(base_name, file)
+
+    report = (base_name, df)
+    with _report_cache_lock:
+        _report_cache[str(file)] = (signature, report)
+    return report
+
+
+def _take_report(file):
+    # Like read_report, but leaves nothing in the cache so the frame is freed once merged
+    file = Path(file)
+    stat = file.stat()
+    with _report_cache_lock:
+        cached = _report_cache.pop(str(file), None)
+    if cached is not None and cached[0] == (stat.st_size, stat.st_mtime_ns):
+        return cached[1]
+    base_name = report_base_name(file)
+    return base_name, TRANSFORM_PLAN.run(base_name, file)
+
+
+def merge_csv_files(directory, workers=None, low_memory=False):
+    if workers is None:
+        # The app merges from a worker thread, so MERGE_WORKERS > 1 always takes the spawn path of
+        # _parallel_aggregate and pickles every shard. On one CPU that made aggregation slower (0.76x with 8
+        # workers on 50k leads), so keep the default of 1 unless benchmarks/bench_parallel_merge.py shows a gain.
+        workers = int(os.getenv('MERGE_WORKERS', '1'))
     data_dir = Path(directory)
-    dataframes = []
-    trial_leads = None
+    files = sorted(data_dir.glob('*.csv'))
 
-    resource_temp_file = resource_path('resource_fix.csv')
-    files_translate = {
-        'active-members-report': 'לקוחות פעילים',
-        'active-memberships-report': 'מנויים פעילים',
-        'converted-leads-report': 'מתעניינים שהומרו ללקוחות',
-        'all-leads-report': 'כל המתעניינים', 
-        'trial-classes-report': 'שיעורי ניסיון',
-        'lost-leads-report': 'מתעניינים אבודים',
-        'inactive-members-report': 'לקוחות לא פעילים',
-        'future-memberships-report': 'מנויים עתידיים',
-        'expired-memberships-report': 'מנויים שהסתיימו'
-    }
+    # Forget cached reports whose files are gone
+    paths = {str(file) for file in files}
+    with _report_cache_lock:
+        for path in [path for path in _report_cache if path not in paths]:
+            del _report_cache[path]
+
+    if low_memory:
+        # Reports are read without being kept for the next merge
+        return merge_reports((_take_report(file) for file in files), workers, low_memory=True)
+    return merge_reports([read_report(file) for file in files], workers)
+
+
+class ReportPipeline:
+    """
+    Parses report files in a worker pool as soon as each one is available.
+
+    Files submitted while the remaining reports are still downloading are read, normalized and
+    deduplicated in the background (filling the read_report cache), so only the final cross-report
+    merge waits for all inputs.
 
-    # Iterate over each file in the directory and append it to the dataframe list
-    for file in data_dir.glob('*.csv'):
-        base_name = re.sub(r'(\s+\(\d+\))$', '', file.stem) 
-        translated_name = files_translate.get(base_name, file.stem)
-        df = pd.read_csv(file)
-        df['קובץ מקור'] = translated_name
-        if 'trial' in base_name:
-            trial_leads = df
-            trial_leads['Normalized Phone'] = trial_leads['טלפון'].astype(str).apply(lambda x: x[-6:])
-            trial_leads['תאריך'] = pd.to_datetime(trial_leads['תאריך'], format='%d/%m/%Y', errors='coerce')
-            trial_leads = (
-                trial_leads.sort_values(by='תאריך', ascending=False)  # Sort by the date column
-                .drop_duplicates(subset=['Normalized Phone'], keep='first')  # Drop duplicates
-            )
-            df = trial_leads
-
-        if 'expired' in base_name:
-            df['Normalized Phone'] = df['טלפון'].astype(str).apply(lambda x: x[-6:])
-            df.drop('מנוי', axis=1, inplace=True)
-            df = (
-                df.sort_values(by='תאריך סיום', ascending=False)
-                .drop_duplicates(subset=['Normalized Phone'], keep='first')
-            )
+    Parameters:
+        max_workers (int): Optional; Number of parsing threads.
+    """
+
+    def __init__(self, max_workers=None):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or min(4, os.cpu_count() or 1))
+        self._futures = []
+
+    def submit(self, file):
+        """Start parsing a finished report file."""
+        self._futures.append(self._executor.submit(read_report, file))
+
+    def merge(self, directory, workers=None, low_memory=False):
+        """Wait for the submitted reports and merge every report in the directory."""
+        wait(self._futures)
+        self._executor.shutdown()
+        self._futures = []
+        # Reports that failed to parse in the background are read again here so their error surfaces
+        return merge_csv_files(directory, workers, low_memory)
+
+    def close(self):
+        """Stop the parsing threads without merging, e.g. when the download failed. Safe to call more than once."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def merge_reports(reports, workers=1, low_memory=False):
+    """
+    Merge parsed reports (as returned by read_report) into one row per lead.
 
+    Parameters:
+        reports (iterable): (base_name, DataFrame) tuples.
+        workers (int): Number of processes to aggregate with; 1 merges in this process.
+        low_memory (bool): Optional; Aggregate the leads in hash partitions one after another, instead of
+            all at once or in worker processes.
+
+    Returns:
+        DataFrame: The merged and cleaned leads, with 'Cluster ID' and 'Cluster Confidence' linking
+        leads of the same person (see resolve_identities), or None if there are no reports.
+    """
+    dataframes = []
+    marked_phones = {column: set() for column in TRANSFORM_PLAN.mark_columns()}
+    resource_temp_file = resource_path('resource_fix.csv')
+
+    for base_name, df in reports:
+        marks = TRANSFORM_PLAN.step(base_name).marks
+        if marks and 'Normalized Phone' in df.columns:
+            marked_phones[marks].update(df['Normalized Phone'])
         dataframes.append(df)
+        del df
 
     if not dataframes:
         return None
@@ -100,30 +208,77 @@ def merge_csv_files(directory):
     dataframes.append(resource_df)
 
     merged_df = pd.concat(dataframes, ignore_index=True)
-    merged_df['Normalized Phone'] = merged_df['טלפון'].astype(str).apply(lambda x: x[-6:])
+    dataframes.clear()
+    merged_df['Normalized Phone'] = normalize_phone(merged_df['טלפון'])
 
-    
+    if not pd.api.types.is_datetime64_any_dtype(merged_df['נוצר בתאריך']):
+        merged_df['נוצר בתאריך'] = pd.to_datetime(merged_df['נוצר בתאריך'], format=DATE_FORMAT, errors='coerce')
+
+    if low_memory:
+        cleaned_data_corrected = _chunked_aggregate(merged_df, marked_phones, LOW_MEMORY_CHUNKS)
+    elif workers > 1:
+        cleaned_data_corrected = _parallel_aggregate(merged_df, marked_phones, workers)
+    else:
+        cleaned_data_corrected = aggregate_leads(merged_df, marked_phones)
+    del merged_df
+
+    # Replace ages under 15 with the mean age (over all leads, so this runs after the shards are combined)
+    if 'גיל' in cleaned_data_corrected.columns:
+        mean_age = cleaned_data_corrected['גיל'].mean(skipna=True)
+        ages = cleaned_data_corrected['גיל']
+        cleaned_data_corrected['גיל'] = ages.mask(ages < 13, mean_age)
+
+    # Link leads that re-registered with another or mistyped number, before anything reads the result
+    cleaned_data_corrected = resolve_identities(cleaned_data_corrected, inplace=True)
+
+
+    sheets_data_dir = Path(resource_path('sheets_data'))
+    sheets_data_dir.mkdir(parents=True, exist_ok=True)
+
+    output_file = sheets_data_dir / 'cleaned_data_corrected.csv'
+    cleaned_data_corrected.to_csv(output_file, index=False, encoding='utf-8-sig')
+
+    return cleaned_data_corrected
+
+
+
+def _aggregate_values(x):
+    # Convert all values to strings before joining
+    if x.dtype == object and not x.dropna().empty:
+        return ', '.join(sorted(set(map(str, x.dropna()))))
+    if not x.dropna().empty and np.issubdtype(x.dtype, np.datetime64):
+        return min(x.dropna())
+    if not x.dropna().empty:
+        return x.dropna().iloc[0]
+    return np.nan
+
+
+def aggregate_leads(merged_df, marked_phones):
+    """
+    Collapse the concatenated report rows into one cleaned row per normalized phone.
+
+    Every step only looks at the rows of a single lead, so the result for a subset of phones
+    is the same as the corresponding rows of the result for all phones.
+
+    Parameters:
+        merged_df (DataFrame): The concatenated report rows, with 'Normalized Phone'.
+        marked_phones (dict): Mark column -> phones that get 'V' in it.
 
-    merged_df['נוצר בתאריך'] = pd.to_datetime(merged_df['נוצר בתאריך'], format='%d/%m/%Y', errors='coerce')
+    Returns:
+        DataFrame: One row per lead, sorted by 'Normalized Phone'.
+    """
     aggregations_corrected = {
-        col: (
-            lambda x: ', '.join(sorted(set(map(str, x.dropna()))))  # Convert all values to strings before joining
-            if x.dtype == object and not x.dropna().empty else
-            min(x.dropna()) if not x.dropna().empty and np.issubdtype(x.dtype, np.datetime64) else
-            x.dropna().iloc[0] if not x.dropna().empty else
-            np.nan
-        )
+        col: _aggregate_values
         for col in merged_df.columns if col != 'Normalized Phone'
     }
     cleaned_data_corrected = merged_df.groupby('Normalized Phone').agg(aggregations_corrected).reset_index()
 
-    cleaned_data_corrected['מנוי'] = cleaned_data_corrected.apply(
-        lambda row: f"{row['חברות']}, {row['מנוי']}" if pd.notna(row['חברות']) and pd.notna(row['מנוי']) and row['חברות'] != row['מנוי']
-        else row['חברות'] if pd.notna(row['חברות'])
-        else row['מנוי'] if pd.notna(row['מנוי'])
-        else np.nan,
-        axis=1
-    )   
+    # Membership and subscription combined: both when they differ, otherwise whichever is present
+    membership, subscription = cleaned_data_corrected['חברות'], cleaned_data_corrected['מנוי']
+    both = membership.notna() & subscription.notna() & (membership != subscription)
+    combined = membership.where(membership.notna(), subscription).astype(object)
+    combined[both] = membership[both].astype(str) + ', ' + subscription[both].astype(str)
+    cleaned_data_corrected['מנוי'] = combined
 
     cleaned_data_corrected.drop('חברות', axis=1, inplace=True)
     
@@ -137,13 +292,6 @@ def merge_csv_files(directory):
     ).fillna('ללא מקור').replace('', 'ללא מקור')
 
 
-    # Replace ages under 15 with the mean age
-    if 'גיל' in cleaned_data_corrected.columns:
-        mean_age = cleaned_data_corrected['גיל'].mean(skipna=True)
-        cleaned_data_corrected['גיל'] = cleaned_data_corrected['גיל'].apply(
-            lambda age: mean_age if age < 13 else age
-        )
-
     cleaned_data_corrected['רלוונטי'] = np.where(
         cleaned_data_corrected['סטטוס'] == 'סומן כאבוד', 'לא',
         np.where(
@@ -151,38 +299,190 @@ def merge_csv_files(directory):
         )
     )
     
-    if trial_leads is not None:
-        trial_phones = set(trial_leads['טלפון'].astype(str).apply(lambda x: x[-6:]))  # Normalize phone numbers in trial_leads
-        cleaned_data_corrected['עשו ניסיון'] = cleaned_data_corrected['Normalized Phone'].apply(lambda x: 'V' if x in trial_phones else '')
+    # Mark leads that appear in the reports declaring a mark column ('עשו ניסיון', 'יש מנוי')
+    for column, phones in marked_phones.items():
+        cleaned_data_corrected[column] = np.where(cleaned_data_corrected['Normalized Phone'].isin(phones), 'V', '')
 
+    return cleaned_data_corrected
 
-    # Add 'יש מנוי' column based on conditions in 'קובץ מקור'
-    cleaned_data_corrected['יש מנוי'] = cleaned_data_corrected['קובץ מקור'].apply(
-        lambda x: 'V' if 'מנויים עתידיים' in x or 'מנויים פעילים' in x else ''
-    )
 
+# Shards handed to forked workers, which inherit them without copying
+_FORKED_SHARDS = None
 
-    sheets_data_dir = Path(resource_path('sheets_data'))
-    sheets_data_dir.mkdir(parents=True, exist_ok=True)
 
-    output_file = sheets_data_dir / 'cleaned_data_corrected.csv'
-    cleaned_data_corrected.to_csv(output_file, index=False, encoding='utf-8-sig')
+def _aggregate_forked_shard(index):
+    shard, marked_phones = _FORKED_SHARDS[index]
+    return aggregate_leads(shard, marked_phones)
 
-    return cleaned_data_corrected
 
+def _shard_ids(merged_df, shards):
+    return pd.util.hash_array(merged_df['Normalized Phone'].to_numpy(dtype=object)) % shards
 
 
-def authenticate_gsheets(json_keyfile):
-    # Authenticate with Google Sheets
-    scope = ['https://spreadsheets.google.com/feeds','https://www.googleapis.com/auth/drive']
-    credentials = ServiceAccountCredentials.from_json_keyfile_name(json_keyfile, scope)
-    gc = gspread.authorize(credentials)
-    return gc
+def _chunked_aggregate(merged_df, marked_phones, chunks):
+    """
+    Run aggregate_leads over hash partitions of the leads one after another, so only one partition's
+    working copies exist at a time. The result equals the single-pass result.
+    """
+    shard_ids = _shard_ids(merged_df, chunks)
+    results = []
+    for shard in range(chunks):
+        rows = shard_ids == shard
+        if rows.any():
+            results.append(aggregate_leads(merged_df[rows], marked_phones))
+    return pd.concat(results, ignore_index=True).sort_values('Normalized Phone', kind='stable', ignore_index=True)
+
+
+def _parallel_aggregate(merged_df, marked_phones, workers):
+    """
+    Run aggregate_leads over hash partitions of the leads in a process pool.
+
+    Rows are partitioned by a hash of their normalized phone, so a lead never spans two shards and
+    the concatenated shard results equal the single-process result. Where the platform allows it
+    (fork, with no other threads running) workers inherit the shards copy-on-write instead of
+    receiving pickled copies. The app merges from a worker thread, so it takes the spawn path, where
+    each shard is pickled together with only the marked phones that occur in it.
+    """
+    global _FORKED_SHARDS
+    shard_ids = _shard_ids(merged_df, workers)
+    shards = [shard for _, shard in merged_df.groupby(shard_ids, sort=False)]
+    shard_marks = []
+    for shard in shards:
+        shard_phones = set(shard['Normalized Phone'])
+        shard_marks.append({column: phones & shard_phones for column, phones in marked_phones.items()})
+
+    use_fork = 'fork' in multiprocessing.get_all_start_methods() and threading.active_count() == 1
+    if use_fork:
+        _FORKED_SHARDS = list(zip(shards, shard_marks))
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as executor:
+                results = list(executor.map(_aggregate_forked_shard, range(len(shards))))
+        finally:
+            _FORKED_SHARDS = None
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            results = list(executor.map(aggregate_leads, shards, shard_marks))
+
+    return pd.concat(results, ignore_index=True).sort_values('Normalized Phone', kind='stable', ignore_index=True)
 
 
-def upload_to_gsheets(merged_df, gc, sheet_url):
+GSHEETS_SCOPES = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+
+
+class SheetsClient:
+    """
+    Long-lived Google Sheets client shared by the upload, formatting and open-sheet paths.
+
+    The access token is cached by the credentials and only refreshed once it expires, all
+    requests (including token refreshes) go through one keep-alive connection pool, and
+    spreadsheet / worksheet lookups are cached per sheet URL so repeated runs skip the
+    metadata round trips.
+
+    Parameters:
+        json_keyfile (str): Path to the service account key file.
+        token_uri (str): Optional; Override for the OAuth token endpoint (e.g. a local mock server).
+        pool_size (int): Number of keep-alive connections kept per host.
+    """
+
+    def __init__(self, json_keyfile, token_uri=None, pool_size=10):
+        credentials = Credentials.from_service_account_file(json_keyfile, scopes=GSHEETS_SCOPES)
+        if token_uri:
+            credentials = credentials.with_token_uri(token_uri)
+        self.credentials = credentials
+
+        # A single pooled session is used both for the API calls and for token refreshes
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        token_session = requests.Session()
+        token_session.mount('https://', adapter)
+        token_session.mount('http://', adapter)
+        self.session = AuthorizedSession(credentials, auth_request=Request(session=token_session))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.gc = gspread.Client(auth=credentials, session=self.session)
+        self._spreadsheets = {}
+        self._worksheets = {}
+        self._lock = threading.Lock()
+
+    def spreadsheet(self, sheet_url):
+        """Return the (cached) spreadsheet for a URL."""
+        with self._lock:
+            spreadsheet = self._spreadsheets.get(sheet_url)
+        if spreadsheet is None:
+            spreadsheet = self.gc.open_by_url(sheet_url)
+            with self._lock:
+                self._spreadsheets[sheet_url] = spreadsheet
+        return spreadsheet
+
+    def worksheet(self, sheet_url, index=0):
+        """Return the (cached) worksheet at ``index`` of the spreadsheet at ``sheet_url``."""
+        key = (sheet_url, index)
+        with self._lock:
+            worksheet = self._worksheets.get(key)
+        if worksheet is None:
+            worksheet = self.spreadsheet(sheet_url).get_worksheet(index)
+            with self._lock:
+                self._worksheets[key] = worksheet
+        return worksheet
+
+    def worksheet_url(self, sheet_url, index=0):
+        """Return the direct URL of an already looked-up worksheet, or ``sheet_url`` without a network call."""
+        with self._lock:
+            worksheet = self._worksheets.get((sheet_url, index))
+        return worksheet.url if worksheet is not None else sheet_url
+
+    def invalidate(self, sheet_url=None):
+        """Drop cached metadata for one sheet URL, or for all of them."""
+        with self._lock:
+            if sheet_url is None:
+                self._spreadsheets.clear()
+                self._worksheets.clear()
+            else:
+                self._spreadsheets.pop(sheet_url, None)
+                for key in [key for key in self._worksheets if key[0] == sheet_url]:
+                    del self._worksheets[key]
+
+    def close(self):
+        self.session.close()
+
+
+_sheets_clients = {}
+_sheets_clients_lock = threading.Lock()
+
+
+def authenticate_gsheets(json_keyfile, token_uri=None):
+    """
+    Return the shared SheetsClient for a key file, creating it on first use.
+
+    The client is kept for the lifetime of the process so every run reuses the same
+    credentials, token and connection pool.
+    """
+    token_uri = token_uri or os.getenv('GSHEETS_TOKEN_URI')
+    key = (os.path.abspath(json_keyfile), token_uri)
+    with _sheets_clients_lock:
+        client = _sheets_clients.get(key)
+        if client is None:
+            client = SheetsClient(json_keyfile, token_uri=token_uri)
+            _sheets_clients[key] = client
+        return client
+
+
+def prepare_sheet_frame(merged_df, inplace=False):
+    """
+    Return the leads as written to every output: sorted by create date, with dates as 'dd/mm/YYYY' text.
+
+    Parameters:
+        merged_df (DataFrame): The final leads table.
+        inplace (bool): Optional; Sort and convert merged_df itself instead of a copy.
+
+    Returns:
+        DataFrame: The sorted frame with datetime columns converted to strings.
+    """
     # Sort the table by create date
-    merged_df = merged_df.sort_values(by='נוצר בתאריך', ascending=True)
+    if inplace:
+        merged_df.sort_values(by='נוצר בתאריך', ascending=True, inplace=True)
+    else:
+        merged_df = merged_df.sort_values(by='נוצר בתאריך', ascending=True)
     merged_df.reset_index(drop=True, inplace=True)
 
    # Check and convert all datetime columns to string format
@@ -190,17 +490,80 @@ def upload_to_gsheets(merged_df, gc, sheet_url):
         if pd.api.types.is_datetime64_any_dtype(merged_df[col]):
             # Ensure all datetime data is converted to strings in the ISO 8601 format.
             merged_df[col] = merged_df[col].dt.strftime('%d/%m/%Y') if merged_df[col].notna().any() else merged_df[col]
+    return merged_df
 
+
+def sheet_rows(sheet_df):
+    """Return the header and rows of a prepared frame as JSON-serializable lists, with NaN and infinity as None."""
     # Replace infinite and NaN values with None for JSON serialization
-    merged_df = merged_df.replace([float('inf'), -float('inf'), float('nan')], None)
-    
-    worksheet = gc.open_by_url(sheet_url).sheet1
-    worksheet.clear()
+    sheet_df = sheet_df.replace([float('inf'), -float('inf'), float('nan')], None)
+    return [sheet_df.columns.tolist()] + sheet_df.where(pd.notnull(sheet_df), None).values.tolist()
 
-    # Convert DataFrame to list of lists, replacing NaN with None for JSON serialization
-    data = [merged_df.columns.tolist()] + merged_df.where(pd.notnull(merged_df), None).values.tolist()
-    worksheet.update(data)
-    
+
+def sheet_row_chunks(sheet_df, chunk_rows):
+    """
+    Yield the payload of sheet_rows in chunks of at most chunk_rows rows, the header leading the first.
+
+    Only one chunk is converted to Python objects at a time.
+    """
+    header = sheet_df.columns.tolist()
+    if sheet_df.empty:
+        yield [header]
+        return
+    for start in range(0, len(sheet_df), chunk_rows):
+        chunk = sheet_rows(sheet_df.iloc[start:start + chunk_rows])
+        yield chunk if start == 0 else chunk[1:]
+
+
+def _cleared_worksheet(client, sheet_url):
+    try:
+        worksheet = client.worksheet(sheet_url)
+        worksheet.clear()
+    except gspread.exceptions.APIError:
+        # The cached worksheet may have been deleted or replaced; look it up again once
+        client.invalidate(sheet_url)
+        worksheet = client.worksheet(sheet_url)
+        worksheet.clear()
+    return worksheet
+
+
+def write_worksheet(client, sheet_url, rows):
+    """
+    Replace the worksheet's content with rows (header first) and format the header.
+
+    Parameters:
+        client (SheetsClient): The authenticated client.
+        sheet_url (str): The spreadsheet URL.
+        rows (list): The header row followed by the data rows.
+    """
+    worksheet = _cleared_worksheet(client, sheet_url)
+    worksheet.update(rows)
+    _format_header(worksheet, len(rows), len(rows[0]))
+
+
+def write_worksheet_chunks(client, sheet_url, chunks, row_count):
+    """
+    Replace the worksheet's content chunk by chunk, so the whole payload never exists at once.
+
+    Parameters:
+        client (SheetsClient): The authenticated client.
+        sheet_url (str): The spreadsheet URL.
+        chunks (iterable): Lists of rows, the first starting with the header (see sheet_row_chunks).
+        row_count (int): The total number of rows, header included.
+    """
+    worksheet = _cleared_worksheet(client, sheet_url)
+    if worksheet.row_count < row_count:
+        worksheet.add_rows(row_count - worksheet.row_count)
+    next_row = 1
+    column_count = 0
+    for chunk in chunks:
+        worksheet.update(chunk, range_name=f'A{next_row}')
+        column_count = column_count or len(chunk[0])
+        next_row += len(chunk)
+    _format_header(worksheet, row_count, column_count)
+
+
+def _format_header(worksheet, row_count, column_count):
     # Formatting the header
     header_format = {
         "textFormat": {"bold": True, "fontSize": 12, "foregroundColor": {"red": 1.0, "green": 1.0, "blue": 1.0}},
@@ -209,12 +572,13 @@ def upload_to_gsheets(merged_df, gc, sheet_url):
         "verticalAlignment": "MIDDLE"
     }
     
-    end_col_letter = column_to_letter(len(merged_df.columns))
+    end_col_letter = column_to_letter(column_count)
     start_range = 'A1'
-    end_range = gspread.utils.rowcol_to_a1(len(merged_df) + 1, len(merged_df.columns))
+    end_range = gspread.utils.rowcol_to_a1(row_count, column_count)
     worksheet.set_basic_filter(f'{start_range}:{end_range}')
     worksheet.format(f'A1:{end_col_letter}1', header_format)
 
+
 # directory = os.getenv('DIRECTORY')
 # json_keyfile = os.getenv('JSON_KEYFILE')
 # sheet_url = os.getenv('SHEET_URL')
@@ -224,4 +588,4 @@ def upload_to_gsheets(merged_df, gc, sheet_url):
 
 # column_order = ['נוצר בתאריך', 'שם', 'טלפון',  'מקור', 'סטטוס', 'סיבות התנגדות', 'מפגש ניסיון','עשו ניסיון', 'רלוונטי' ,'מנוי', 'גיל', 'קובץ מקור']
 # final = set_column_order(merged_df, column_order)
-# upload_to_gsheets(final, gc, sheet_url)
+# write_worksheet(gc, sheet_url, sheet_rows(prepare_sheet_frame(final)))
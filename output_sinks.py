@@ -0,0 +1,243 @@
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from olive_table import authenticate_gsheets, prepare_sheet_frame, sheet_rows, sheet_row_chunks, write_worksheet, write_worksheet_chunks
+from utils import resource_path
+
+# Default destinations of the local sinks, relative to the application directory
+DEFAULT_PATHS = {
+    'csv': os.path.join('exports', 'leads.csv'),
+    'parquet': os.path.join('exports', 'leads.parquet'),
+    'sqlite': os.path.join('exports', 'leads.sqlite'),
+    'xlsx': os.path.join('exports', 'leads.xlsx'),
+}
+# Rows converted and written at a time in low-memory mode
+LOW_MEMORY_CHUNK_ROWS = 5000
+
+
+class SinkPayload:
+    """
+    The final leads prepared once and shared, read-only, by every sink of a run.
+
+    Args:
+        df (DataFrame): The final leads table, in output column order.
+        chunk_rows (int): Optional; Low-memory mode: ``df`` is prepared in place (the caller hands it over)
+            and sinks write it in chunks of this many rows instead of building whole copies.
+    """
+
+    def __init__(self, df, chunk_rows=None):
+        self.chunk_rows = chunk_rows
+        self.frame = prepare_sheet_frame(df, inplace=chunk_rows is not None)
+        self._rows = None
+        self._lock = threading.Lock()
+
+    @property
+    def rows(self):
+        """The header and rows as JSON-serializable lists, built by the first sink that needs them."""
+        with self._lock:
+            if self._rows is None:
+                self._rows = sheet_rows(self.frame)
+            return self._rows
+
+    def row_chunks(self):
+        """Yield the rows in chunks of ``chunk_rows``, the header leading the first."""
+        return sheet_row_chunks(self.frame, self.chunk_rows)
+
+
+class OutputSink:
+    """A destination the final leads are written to. Subclasses implement ``write``."""
+
+    name = 'sink'
+
+    def write(self, payload):
+        raise NotImplementedError
+
+    def __repr__(self):
+        return self.name
+
+
+class GoogleSheetsSink(OutputSink):
+    """
+    Replaces the content of the Google Sheet.
+
+    Args:
+        json_keyfile (str): The service account key file.
+        sheet_url (str): The spreadsheet URL.
+    """
+
+    name = 'sheets'
+
+    def __init__(self, json_keyfile, sheet_url):
+        self.json_keyfile = json_keyfile
+        self.sheet_url = sheet_url
+
+    def write(self, payload):
+        client = authenticate_gsheets(self.json_keyfile)
+        if payload.chunk_rows:
+            write_worksheet_chunks(client, self.sheet_url, payload.row_chunks(), len(payload.frame) + 1)
+        else:
+            write_worksheet(client, self.sheet_url, payload.rows)
+
+
+class FileSink(OutputSink):
+    """
+    Writes a local file. The file is written next to its destination and then moved into place,
+    so readers never see a partial export.
+
+    Args:
+        path (str): The destination file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __repr__(self):
+        return f'{self.name}:{self.path}'
+
+    def write(self, payload):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        try:
+            self.write_file(payload, tmp_path)
+            os.replace(tmp_path, self.path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def write_file(self, payload, path):
+        raise NotImplementedError
+
+
+class CsvSink(FileSink):
+    name = 'csv'
+
+    def write_file(self, payload, path):
+        payload.frame.to_csv(path, index=False, encoding='utf-8-sig', chunksize=payload.chunk_rows)
+
+
+class ParquetSink(FileSink):
+    name = 'parquet'
+
+    def write_file(self, payload, path):
+        if not payload.chunk_rows:
+            payload.frame.to_parquet(path, index=False)
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        # One row group per chunk, all with the schema inferred from the whole frame
+        frame = payload.frame
+        schema = pa.Schema.from_pandas(frame, preserve_index=False)
+        with pq.ParquetWriter(path, schema) as writer:
+            for start in range(0, len(frame), payload.chunk_rows):
+                chunk = frame.iloc[start:start + payload.chunk_rows]
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+class XlsxSink(FileSink):
+    name = 'xlsx'
+
+    def write_file(self, payload, path):
+        # pandas writes .xlsx through openpyxl
+        payload.frame.to_excel(path, index=False, engine='openpyxl')
+
+
+class SqliteSink(FileSink):
+    """
+    Replaces a table of a SQLite database.
+
+    Args:
+        path (str): The database file.
+        table (str): Optional; The table holding the leads.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path, table='leads'):
+        super().__init__(path)
+        self.table = table
+
+    def write_file(self, payload, path):
+        if os.path.exists(self.path):
+            # Keep the database's other tables
+            shutil.copyfile(self.path, path)
+        connection = sqlite3.connect(path)
+        try:
+            payload.frame.to_sql(self.table, connection, if_exists='replace', index=False, chunksize=payload.chunk_rows)
+            connection.commit()
+        finally:
+            connection.close()
+
+
+FILE_SINKS = {'csv': CsvSink, 'parquet': ParquetSink, 'sqlite': SqliteSink, 'xlsx': XlsxSink}
+
+
+def configured_sinks(spec, json_keyfile=None, sheet_url=None):
+    """
+    Build the sinks named in a configuration string.
+
+    Args:
+        spec (str): Comma-separated sink names, each optionally followed by ':<path>',
+            e.g. 'sheets,csv,sqlite:exports/leads.db'. File sinks without a path use DEFAULT_PATHS.
+        json_keyfile (str): Optional; The service account key file, for the 'sheets' sink.
+        sheet_url (str): Optional; The spreadsheet URL, for the 'sheets' sink.
+
+    Returns:
+        list: The sinks, in configuration order.
+
+    Raises:
+        ValueError: If a sink name is unknown.
+    """
+    sinks = []
+    for entry in (spec or 'sheets').split(','):
+        name, _, path = entry.strip().partition(':')
+        name = name.lower()
+        if not name:
+            continue
+        if name == 'sheets':
+            sinks.append(GoogleSheetsSink(json_keyfile, sheet_url))
+        elif name in FILE_SINKS:
+            sinks.append(FILE_SINKS[name](path or resource_path(DEFAULT_PATHS[name])))
+        else:
+            raise ValueError(f'Unknown output sink: {name}')
+    return sinks
+
+
+def write_sinks(df, sinks, max_workers=None, chunk_rows=None):
+    """
+    Write the final leads to every sink concurrently.
+
+    The frame is prepared once and shared by all sinks. A failing or slow sink does not stop the others:
+    every sink runs to completion and reports its own outcome.
+
+    Args:
+        df (DataFrame): The final leads table.
+        sinks (list): The sinks to write to.
+        max_workers (int): Optional; Sinks written at the same time. Defaults to one thread per sink.
+        chunk_rows (int): Optional; Low-memory mode, see SinkPayload. ``df`` is then modified in place.
+
+    Returns:
+        list: One dict per sink, in order, with 'sink', 'seconds' and 'error' (None on success).
+    """
+    if not sinks:
+        return []
+    payload = SinkPayload(df, chunk_rows)
+
+    def run(sink):
+        started = time.perf_counter()
+        error = None
+        try:
+            sink.write(payload)
+        except Exception as e:
+            error = e
+        seconds = time.perf_counter() - started
+        if error is None:
+            print(f'{sink!r}: written in {seconds:.2f}s')
+        else:
+            print(f'{sink!r}: failed after {seconds:.2f}s. Reason: {error}')
+        return {'sink': sink, 'seconds': seconds, 'error': error}
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(sinks)) as executor:
+        return list(executor.map(run, sinks))
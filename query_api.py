@@ -0,0 +1,291 @@
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+import pandas as pd
+from statistics_calculator import statistics_tables
+from utils import resource_path
+
+DEFAULT_CSV = os.path.join('sheets_data', 'cleaned_data_corrected.csv')
+DEFAULT_PORT = 8765
+
+# Query parameters of /leads and the columns they filter on
+FILTER_COLUMNS = {
+    'source': 'מקור',
+    'status': 'סטטוס',
+    'relevant': 'רלוונטי',
+    'trial': 'עשו ניסיון',
+    'member': 'יש מנוי',
+    'file': 'קובץ מקור',
+}
+# Columns holding comma-separated values, indexed by each value
+MULTI_VALUE_COLUMNS = {'מקור', 'סטטוס', 'קובץ מקור'}
+MAX_CACHED_RESPONSES = 1024
+
+
+def _normalize_query_phone(phone):
+    digits = re.sub(r'\D', '', phone)
+    return digits[-6:] if digits else None
+
+
+def _json_value(value):
+    if value is None or (isinstance(value, float) and not np.isfinite(value)) or value is pd.NaT:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.strftime('%d/%m/%Y')
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _read_merged_csv(path):
+    return pd.read_csv(path, dtype={'Normalized Phone': str, 'טלפון': str}, parse_dates=['נוצר בתאריך'])
+
+
+def _records(df):
+    columns = df.columns.tolist()
+    return [{col: _json_value(value) for col, value in zip(columns, row)} for row in df.itertuples(index=False, name=None)]
+
+
+class _Snapshot:
+    """Immutable view of one merge result with its lookup indexes."""
+
+    def __init__(self, df, version):
+        self.version = version
+        self.loaded_at = time.time()
+        self.df = df.reset_index(drop=True)
+        self.records = _records(self.df)
+        self.created = self.df['נוצר בתאריך'].to_numpy() if 'נוצר בתאריך' in self.df.columns else None
+        self.by_phone = dict(zip(self.df['Normalized Phone'].astype(str), range(len(self.df))))
+
+        # Inverted index: column -> value -> sorted row positions
+        self.indexes = {}
+        for column in FILTER_COLUMNS.values():
+            if column not in self.df.columns:
+                continue
+            values = self.df[column].fillna('').astype(str)
+            if column in MULTI_VALUE_COLUMNS:
+                values = values.str.split(',').explode().str.strip()
+            positions = values.index.to_numpy()
+            self.indexes[column] = {value: np.unique(positions[rows]) for value, rows in values.groupby(values).indices.items()}
+
+        self.statistics = None
+
+
+class LeadStore:
+    """
+    In-process store of the latest merged leads, indexed for the query API.
+
+    A store either receives frames from the merge (``load``) or follows the merge's CSV output
+    (``csv_path``), reloading it when the file changes. A store following a CSV can still be given a
+    frame with ``load``; it is served until the CSV changes again. Every load replaces the indexes
+    and clears the response cache.
+
+    Args:
+        csv_path (str): Optional; The merged CSV to follow.
+    """
+
+    def __init__(self, csv_path=None):
+        self.csv_path = csv_path
+        self._csv_signature = None
+        self._snapshot = None
+        self._version = 0
+        self._cache = {}
+        self._lock = threading.Lock()
+        # Held while a changed CSV is reloaded, so concurrent queries wait for one reload instead of each parsing it
+        self._refresh_lock = threading.Lock()
+
+    def load(self, df):
+        """Replace the stored leads with a new merge result."""
+        # The followed CSV as it is now is superseded by this frame, so it is not reloaded over it
+        self._load(df, self._csv_stat())
+
+    def _load(self, df, csv_signature):
+        with self._lock:
+            self._version += 1
+            self._snapshot = _Snapshot(df, self._version)
+            self._cache = {}
+            self._csv_signature = csv_signature
+
+    def follow(self, csv_path):
+        """Serve a merged CSV from now on, loading it on the next query, and release the loaded leads."""
+        with self._lock:
+            self.csv_path = csv_path
+            self._csv_signature = None
+            self._snapshot = None
+            self._cache = {}
+
+    def _csv_stat(self):
+        if self.csv_path is None:
+            return None
+        try:
+            stat = os.stat(self.csv_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def _refresh(self):
+        signature = self._csv_stat()
+        if signature is None or signature == self._csv_signature:
+            return
+        with self._refresh_lock:
+            # Another query may have reloaded the CSV while this one waited
+            signature = self._csv_stat()
+            if signature is None or signature == self._csv_signature:
+                return
+            # The signature is the one read before parsing, so a CSV rewritten meanwhile is picked up on the next query
+            self._load(_read_merged_csv(self.csv_path), signature)
+
+    def load_csv(self, path):
+        """Replace the stored leads with a merged CSV written by merge_csv_files."""
+        self.load(_read_merged_csv(path))
+
+    def snapshot(self):
+        self._refresh()
+        return self._snapshot
+
+    def cached(self, key, build):
+        """Return the cached response for a key, building it for the current version if needed."""
+        snapshot = self.snapshot()
+        if snapshot is None:
+            return None
+        response = self._cache.get((snapshot.version, key))
+        if response is None:
+            response = json.dumps(build(snapshot), ensure_ascii=False).encode('utf-8')
+            with self._lock:
+                if self._snapshot is snapshot:
+                    if len(self._cache) >= MAX_CACHED_RESPONSES:
+                        self._cache = {}
+                    self._cache[(snapshot.version, key)] = response
+        return response
+
+    def lead(self, snapshot, phone):
+        row = snapshot.by_phone.get(_normalize_query_phone(phone) or '')
+        return None if row is None else snapshot.records[row]
+
+    def leads(self, snapshot, params):
+        """Return the leads matching the filters in params (query string values)."""
+        rows = None
+        for param, column in FILTER_COLUMNS.items():
+            if param not in params or column not in snapshot.indexes:
+                continue
+            value = params[param]
+            if param in ('trial', 'member'):
+                value = 'V' if value.lower() in ('1', 'true', 'v', 'yes') else ''
+            matches = snapshot.indexes[column].get(value, np.array([], dtype=np.intp))
+            rows = matches if rows is None else np.intersect1d(rows, matches, assume_unique=True)
+        if rows is None:
+            rows = np.arange(len(snapshot.records))
+
+        if snapshot.created is not None and ('from' in params or 'to' in params):
+            created = snapshot.created[rows]
+            mask = np.ones(len(rows), dtype=bool)
+            if 'from' in params:
+                mask &= created >= np.datetime64(pd.to_datetime(params['from'], format='%d/%m/%Y'))
+            if 'to' in params:
+                mask &= created <= np.datetime64(pd.to_datetime(params['to'], format='%d/%m/%Y'))
+            rows = rows[mask]
+
+        offset = int(params.get('offset', 0))
+        limit = int(params.get('limit', 1000))
+        if offset < 0 or limit < 0:
+            raise ValueError('offset and limit must not be negative')
+        return {
+            'total': int(len(rows)),
+            'offset': offset,
+            'leads': [snapshot.records[row] for row in rows[offset:offset + limit]],
+        }
+
+    def statistics(self, snapshot):
+        if snapshot.statistics is None:
+            tables = statistics_tables(snapshot.df)
+            snapshot.statistics = {
+                key: _records(value) if isinstance(value, pd.DataFrame) else _json_value(value)
+                for key, value in tables.items()
+            }
+        return snapshot.statistics
+
+
+# The store the GUI publishes every merge to
+LEAD_STORE = LeadStore()
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """Read-only JSON endpoints: /health, /leads, /leads/<phone> and /statistics."""
+
+    store = LEAD_STORE
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        path = url.path.rstrip('/')
+        try:
+            if path == '/health':
+                snapshot = self.store.snapshot()
+                body = json.dumps({
+                    'version': snapshot.version if snapshot else 0,
+                    'leads': len(snapshot.records) if snapshot else 0,
+                    'loaded_at': snapshot.loaded_at if snapshot else None,
+                }).encode('utf-8')
+            elif path == '/leads':
+                body = self.store.cached(('leads', tuple(sorted(params.items()))), lambda snapshot: self.store.leads(snapshot, params))
+            elif path.startswith('/leads/'):
+                phone = path[len('/leads/'):]
+                body = self.store.cached(('lead', phone), lambda snapshot: self.store.lead(snapshot, phone))
+                if body == b'null':
+                    return self._send(404, {'error': 'lead not found'})
+            elif path == '/statistics':
+                body = self.store.cached(('statistics',), self.store.statistics)
+            else:
+                return self._send(404, {'error': 'not found'})
+        except ValueError as e:
+            return self._send(400, {'error': str(e)})
+
+        if body is None:
+            return self._send(503, {'error': 'no merged data yet'})
+        self._send(200, body)
+
+    def _send(self, status, body):
+        if not isinstance(body, bytes):
+            body = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_query_server(store=None, host='127.0.0.1', port=DEFAULT_PORT):
+    """
+    Serve the query API from a background thread.
+
+    Returns:
+        ThreadingHTTPServer: The running server; call ``shutdown()`` to stop it.
+    """
+    handler = type('BoundQueryHandler', (QueryHandler,), {'store': store or LEAD_STORE})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Read-only JSON API over the merged leads.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.getenv('QUERY_API_PORT', DEFAULT_PORT)))
+    parser.add_argument('--csv', default=resource_path(DEFAULT_CSV), help='merged CSV written by each sync')
+    args = parser.parse_args()
+
+    store = LeadStore(csv_path=args.csv)
+    handler = type('BoundQueryHandler', (QueryHandler,), {'store': store})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f'Serving {Path(args.csv)} on http://{args.host}:{args.port}')
+    server.serve_forever()
@@ -0,0 +1,207 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+import pandas as pd
+import pyarrow.parquet as pq
+from olive_table import report_type
+from utils import resource_path
+
+# Reports that list leads, in increasing order of precedence for a lead's status
+LEAD_REPORTS = ('all-leads-report', 'converted-leads-report', 'lost-leads-report')
+DATE_COLUMNS = ('נוצר בתאריך', 'תאריך', 'תאריך סיום')
+DATE_FORMAT = '%d/%m/%Y'
+
+
+def _typed_report(path):
+    """Read a raw report CSV into typed columns suitable for columnar storage."""
+    df = pd.read_csv(path, dtype={'טלפון': str})
+    for col in DATE_COLUMNS:
+        if col in df.columns and df[col].dtype == object:
+            parsed = pd.to_datetime(df[col], format=DATE_FORMAT, errors='coerce')
+            # Only keep the conversion if it is lossless
+            if parsed.notna().sum() == df[col].notna().sum():
+                df[col] = parsed
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].astype('string')
+    if 'טלפון' in df.columns:
+        df['Normalized Phone'] = df['טלפון'].str[-6:]
+    return df
+
+
+class RawArchive:
+    """
+    Content-addressed archive of the raw Arbox exports of every run.
+
+    Each report file is stored once per distinct content, keyed by the SHA-256 of its bytes, both as
+    the gzipped original (so a snapshot can be restored into the data directory) and as a
+    zstd-compressed Parquet file with typed columns (so snapshots can be compared without re-parsing
+    CSVs). A snapshot is a small JSON manifest mapping report names to object hashes.
+
+    Args:
+        root (str): Optional; The archive directory. Defaults to ``archive`` next to the application.
+    """
+
+    def __init__(self, root=None):
+        self.root = Path(root or resource_path('archive'))
+        self.objects_dir = self.root / 'objects'
+        self.snapshots_dir = self.root / 'snapshots'
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.snapshots_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _object_path(self, digest, suffix):
+        return self.objects_dir / digest[:2] / f'{digest}{suffix}'
+
+    def _store_object(self, path):
+        """Store a report file if its content is not archived yet and return its hash."""
+        data = Path(path).read_bytes()
+        digest = hashlib.sha256(data).hexdigest()
+        raw_path = self._object_path(digest, '.csv.gz')
+        table_path = self._object_path(digest, '.parquet')
+        if raw_path.exists() and table_path.exists():
+            return digest
+
+        raw_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = raw_path.with_suffix('.tmp')
+        with gzip.open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, raw_path)
+
+        tmp_path = table_path.with_suffix('.tmp')
+        _typed_report(path).to_parquet(tmp_path, index=False, compression='zstd')
+        os.replace(tmp_path, table_path)
+        return digest
+
+    def add_snapshot(self, directory):
+        """
+        Archive every known report in a directory as a new snapshot.
+
+        Returns:
+            str: The snapshot id, or the id of the latest snapshot if nothing changed since it was taken.
+        """
+        reports = {}
+        for file in sorted(Path(directory).glob('*.csv')):
+            name = report_type(file)
+            if name is not None:
+                reports[name] = {'hash': self._store_object(file), 'file': file.name}
+        if not reports:
+            return None
+
+        with self._lock:
+            snapshots = self.snapshots()
+            if snapshots and self.load_snapshot(snapshots[-1])['reports'] == reports:
+                return snapshots[-1]
+
+            created_at = datetime.now()
+            snapshot_id = created_at.strftime('%Y%m%d-%H%M%S-%f')
+            manifest = {'id': snapshot_id, 'created_at': created_at.isoformat(), 'reports': reports}
+            (self.snapshots_dir / f'{snapshot_id}.json').write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding='utf-8')
+        return snapshot_id
+
+    def snapshots(self):
+        """Return all snapshot ids, oldest first."""
+        return sorted(path.stem for path in self.snapshots_dir.glob('*.json'))
+
+    def load_snapshot(self, snapshot_id):
+        return json.loads((self.snapshots_dir / f'{snapshot_id}.json').read_text(encoding='utf-8'))
+
+    def read_report(self, snapshot_id, report, columns=None):
+        """Return the typed DataFrame of one report in a snapshot, or None if the snapshot does not contain it."""
+        entry = self.load_snapshot(snapshot_id)['reports'].get(report)
+        if entry is None:
+            return None
+        return _read_table(str(self._object_path(entry['hash'], '.parquet')), tuple(columns) if columns else None).copy()
+
+    def restore(self, snapshot_id, directory):
+        """Write the original report files of a snapshot into a directory."""
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        for entry in self.load_snapshot(snapshot_id)['reports'].values():
+            with gzip.open(self._object_path(entry['hash'], '.csv.gz'), 'rb') as f:
+                (Path(directory) / entry['file']).write_bytes(f.read())
+
+    def lead_statuses(self, snapshot_id):
+        """
+        Return the latest status of every lead in a snapshot.
+
+        Returns:
+            DataFrame: One row per normalized phone with its 'סטטוס' and whether it appears in the lost leads report.
+        """
+        frames = []
+        manifest = self.load_snapshot(snapshot_id)['reports']
+        for precedence, report in enumerate(LEAD_REPORTS):
+            entry = manifest.get(report)
+            if entry is None:
+                continue
+            path = str(self._object_path(entry['hash'], '.parquet'))
+            # Only the phone and status columns are read from the Parquet file
+            columns = tuple(col for col in ('Normalized Phone', 'סטטוס') if col in _table_columns(path))
+            if 'Normalized Phone' not in columns:
+                continue
+            df = _read_table(path, columns).assign(precedence=precedence, lost=report == 'lost-leads-report')
+            frames.append(df)
+
+        if not frames:
+            return pd.DataFrame(columns=['Normalized Phone', 'סטטוס', 'lost'])
+
+        leads = pd.concat(frames, ignore_index=True).dropna(subset=['Normalized Phone'])
+        if 'סטטוס' not in leads.columns:
+            leads['סטטוס'] = pd.NA
+        lost = leads.groupby('Normalized Phone')['lost'].any()
+        leads = (
+            leads.sort_values('precedence', kind='stable')
+            .drop_duplicates(subset=['Normalized Phone'], keep='last')
+            .set_index('Normalized Phone')
+        )
+        leads['lost'] = lost
+        return leads[['סטטוס', 'lost']].reset_index()
+
+    def diff(self, old_snapshot_id, new_snapshot_id):
+        """
+        Compare the leads of two snapshots by normalized phone.
+
+        Returns:
+            dict: DataFrames under 'new_leads' (phones only in the newer snapshot), 'status_changes'
+            (phones whose status changed, with 'סטטוס קודם' and 'סטטוס') and 'lost_leads' (phones that
+            were added to the lost leads report).
+        """
+        old = self.lead_statuses(old_snapshot_id)
+        new = self.lead_statuses(new_snapshot_id)
+        joined = new.merge(old, on='Normalized Phone', how='left', suffixes=('', ' קודם'), indicator=True)
+
+        is_new = joined['_merge'] == 'left_only'
+        both = joined[~is_new]
+        changed = both['סטטוס'].fillna('') != both['סטטוס קודם'].fillna('')
+
+        return {
+            'new_leads': joined.loc[is_new, ['Normalized Phone', 'סטטוס']].reset_index(drop=True),
+            'status_changes': both.loc[changed, ['Normalized Phone', 'סטטוס קודם', 'סטטוס']].reset_index(drop=True),
+            'lost_leads': joined.loc[joined['lost'] & ~(joined['lost קודם'].eq(True)), ['Normalized Phone', 'סטטוס']].reset_index(drop=True),
+        }
+
+
+@lru_cache(maxsize=256)
+def _table_columns(path):
+    return frozenset(pq.read_schema(path).names)
+
+
+@lru_cache(maxsize=64)
+def _read_table(path, columns):
+    # Archived objects never change, so reads can be cached by path
+    return pd.read_parquet(path, columns=list(columns) if columns else None)
+
+
+_archive = None
+
+
+def archive_snapshot(directory):
+    """Archive the reports in a directory into the default archive and return the snapshot id."""
+    global _archive
+    if _archive is None:
+        _archive = RawArchive()
+    return _archive.add_snapshot(directory)
@@ -0,0 +1,188 @@
+import time
+import pandas as pd
+
+DATE_FORMAT = '%d/%m/%Y'
+
+# Columns used downstream (sheet, statistics and merge rules) and the dtype they are read with.
+# Any other column in an export is not read at all.
+LEAD_COLUMNS = {
+    'שם': None,
+    'טלפון': str,
+    'נוצר בתאריך': None,
+    'מקור': None,
+    'סטטוס': None,
+    'סיבות התנגדות': None,
+    'מפגש ניסיון': None,
+    'מנוי': None,
+    'חברות': None,
+    'גיל': 'float64',
+    'מאמנים': None,
+}
+
+# Declarative description of every Arbox report.
+#
+# Each entry maps the report's file name to:
+#     title (str): The value written to 'קובץ מקור' for rows from this report.
+#     columns (dict): Columns to read and their dtypes (None keeps the pandas default). Missing columns are skipped.
+#     dates (dict): Optional; Columns parsed as dates and their formats.
+#     drop (list): Optional; Columns removed before merging.
+#     rename (dict): Optional; Report columns renamed to their output column.
+#     dedup (dict): Optional; Keeps one row per normalized phone, the first after ordering by 'order_by'
+#         ('ascending', and 'order_format' to order by a date string without converting the column).
+#     marks (str): Optional; Output column set to 'V' for every lead that appears in this report.
+#
+# Adding a report only requires a new entry here (and its download URL in auto_download).
+REPORT_SCHEMAS = {
+    'active-members-report': {
+        'title': 'לקוחות פעילים',
+        'columns': LEAD_COLUMNS,
+    },
+    'active-memberships-report': {
+        'title': 'מנויים פעילים',
+        'columns': LEAD_COLUMNS,
+        'marks': 'יש מנוי',
+    },
+    'converted-leads-report': {
+        'title': 'מתעניינים שהומרו ללקוחות',
+        'columns': LEAD_COLUMNS,
+    },
+    'all-leads-report': {
+        'title': 'כל המתעניינים',
+        'columns': LEAD_COLUMNS,
+    },
+    'trial-classes-report': {
+        'title': 'שיעורי ניסיון',
+        'columns': {**LEAD_COLUMNS, 'תאריך': None},
+        'dates': {'תאריך': DATE_FORMAT},
+        'dedup': {'order_by': 'תאריך', 'ascending': False},
+        'marks': 'עשו ניסיון',
+    },
+    'lost-leads-report': {
+        'title': 'מתעניינים אבודים',
+        'columns': LEAD_COLUMNS,
+    },
+    'inactive-members-report': {
+        'title': 'לקוחות לא פעילים',
+        'columns': LEAD_COLUMNS,
+    },
+    'future-memberships-report': {
+        'title': 'מנויים עתידיים',
+        'columns': LEAD_COLUMNS,
+        'marks': 'יש מנוי',
+    },
+    'expired-memberships-report': {
+        'title': 'מנויים שהסתיימו',
+        'columns': {**LEAD_COLUMNS, 'תאריך סיום': None},
+        'drop': ['מנוי'],
+        'dedup': {'order_by': 'תאריך סיום', 'order_format': DATE_FORMAT, 'ascending': False},
+    },
+}
+
+# Dates shared by every report
+DEFAULT_DATES = {'נוצר בתאריך': DATE_FORMAT}
+
+
+def normalize_phone(phones):
+    """Return the last 6 digits of each phone, the key leads are matched on."""
+    return phones.astype(str).str[-6:]
+
+
+class ReportStep:
+    """
+    The compiled read and transform step of one report.
+
+    Args:
+        name (str): The report's file name without extension.
+        schema (dict): The report's entry in REPORT_SCHEMAS.
+    """
+
+    def __init__(self, name, schema):
+        self.name = name
+        self.title = schema.get('title', name)
+        columns = schema.get('columns', LEAD_COLUMNS)
+        self.usecols = set(columns)
+        self.dtype = {col: dtype for col, dtype in columns.items() if dtype is not None}
+        self.dates = {**DEFAULT_DATES, **schema.get('dates', {})}
+        self.drop = list(schema.get('drop', []))
+        self.rename = dict(schema.get('rename', {}))
+        self.dedup = schema.get('dedup')
+        self.marks = schema.get('marks')
+
+    def run(self, path):
+        """
+        Read and transform a report file.
+
+        Returns:
+            tuple: The transformed DataFrame and its profile (rows read and kept, read and transform seconds).
+        """
+        started = time.perf_counter()
+        df = pd.read_csv(path, usecols=lambda col: col in self.usecols, dtype=self.dtype)
+        read_done = time.perf_counter()
+        rows_read = len(df)
+
+        if self.drop:
+            df = df.drop(columns=[col for col in self.drop if col in df.columns])
+        if self.rename:
+            df = df.rename(columns=self.rename)
+        for col, date_format in self.dates.items():
+            if col in df.columns:
+                df[col] = pd.to_datetime(df[col], format=date_format, errors='coerce')
+
+        df['קובץ מקור'] = self.title
+        if 'טלפון' in df.columns:
+            df['Normalized Phone'] = normalize_phone(df['טלפון'])
+
+        if self.dedup and 'Normalized Phone' in df.columns:
+            # One stable sort followed by a single duplicate scan keeps the first row per phone
+            order_by = self.dedup['order_by']
+            order_format = self.dedup.get('order_format')
+            df = df.sort_values(
+                by=order_by,
+                ascending=self.dedup.get('ascending', True),
+                kind='stable',
+                key=(lambda col: pd.to_datetime(col, format=order_format, errors='coerce')) if order_format else None,
+            )
+            df = df[~df['Normalized Phone'].duplicated()]
+
+        profile = {
+            'rows_read': rows_read,
+            'rows_kept': len(df),
+            'read_seconds': read_done - started,
+            'transform_seconds': time.perf_counter() - read_done,
+        }
+        return df, profile
+
+
+class TransformPlan:
+    """
+    Per-report steps compiled once from REPORT_SCHEMAS, plus the profile of the reports run through it.
+
+    Args:
+        schemas (dict): Optional; The registry to compile. Defaults to REPORT_SCHEMAS.
+    """
+
+    def __init__(self, schemas=None):
+        self.schemas = REPORT_SCHEMAS if schemas is None else schemas
+        self.steps = {name: ReportStep(name, schema) for name, schema in self.schemas.items()}
+        self.profile = {}
+
+    def step(self, name):
+        """Return the step of a report; reports missing from the registry get a default step."""
+        if name not in self.steps:
+            self.steps[name] = ReportStep(name, {})
+        return self.steps[name]
+
+    def mark_columns(self):
+        """Return the output columns filled from report membership."""
+        return sorted({step.marks for step in self.steps.values() if step.marks})
+
+    def run(self, name, path):
+        """Run a report's step, keeping its profile (rows read and kept, read and transform seconds) in ``profile``."""
+        df, profile = self.step(name).run(path)
+        self.profile[name] = profile
+        return df
+
+    def take_profile(self):
+        """Return the profiles of the reports run since the last call and start collecting anew."""
+        profile, self.profile = self.profile, {}
+        return profile
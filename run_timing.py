@@ -0,0 +1,211 @@
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from utils import resource_path
+
+HISTORY_FILE = os.path.join('sheets_data', 'run_history.json')
+# Records kept per stage
+HISTORY_LENGTH = 50
+# Weight of the newest run in the running estimates
+SMOOTHING = 0.3
+# Stages are flagged as slow when this many standard deviations above their usual duration (and at least 50% slower)
+ANOMALY_SIGMAS = 3
+ANOMALY_MIN_RUNS = 5
+# ...and at least this many seconds slower, so jitter in short stages is not reported
+ANOMALY_MIN_EXTRA_SECONDS = 2.0
+
+# Guesses for stages that have no history yet, in seconds
+DEFAULT_SECONDS = {'download': 10.0, 'merge': 4.0, 'statistics': 1.5, 'upload': 5.0}
+
+PROCESS_STAGES = ['merge', 'statistics', 'upload']
+
+
+def format_eta(seconds):
+    """Return a short Hebrew remaining-time text, e.g. 'נותרו כ-1:05 דקות'."""
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f'נותרו כ-{seconds} שניות'
+    return f'נותרו כ-{seconds // 60}:{seconds % 60:02d} דקות'
+
+
+class TimingHistory:
+    """
+    Local history of stage durations and input sizes, with a running model per stage.
+
+    The model is an exponentially weighted mean and variance of the duration and, for stages recorded
+    with an input size, of the seconds per unit of input.
+
+    Args:
+        path (str): Optional; The JSON history file. Defaults to ``sheets_data/run_history.json``.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or resource_path(HISTORY_FILE)
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self.data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.data = {}
+
+    def records(self, stage):
+        return self.data.get(stage, [])
+
+    def add(self, stage, seconds, size=None):
+        records = self.data.setdefault(stage, [])
+        records.append({'at': datetime.now().isoformat(), 'seconds': round(seconds, 3), 'size': size})
+        del records[:-HISTORY_LENGTH]
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def model(self, stage):
+        """Return (runs, mean seconds, std seconds, mean seconds per size unit or None)."""
+        records = self.records(stage)
+        mean = var = rate = None
+        for record in records:
+            seconds = record['seconds']
+            if mean is None:
+                mean, var = seconds, 0.0
+            else:
+                delta = seconds - mean
+                mean += SMOOTHING * delta
+                var = (1 - SMOOTHING) * (var + SMOOTHING * delta * delta)
+            if record.get('size'):
+                per_unit = seconds / record['size']
+                rate = per_unit if rate is None else rate + SMOOTHING * (per_unit - rate)
+        return len(records), mean, math.sqrt(var) if var is not None else None, rate
+
+    def predict(self, stage, size=None):
+        """Return the expected duration of a stage in seconds."""
+        _, mean, _, rate = self.model(stage)
+        if rate is not None and size:
+            return rate * size
+        if mean is not None:
+            return mean
+        return DEFAULT_SECONDS.get(stage.split(':')[0], 5.0)
+
+
+class RunTimer:
+    """
+    Tracks the stages of one sync, predicts the remaining time from history and flags slow stages.
+
+    Args:
+        stages (list): The stage names of the run, in order (e.g. 'download:all-leads-report', 'merge').
+        on_update (Callable[[int, float], None]): Optional; Called with the progress percentage and the
+            estimated remaining seconds whenever they change.
+        history (TimingHistory): Optional; The history to predict from and record to.
+    """
+
+    def __init__(self, stages, on_update=None, history=None):
+        self.history = history or TimingHistory()
+        self.on_update = on_update
+        self.stages = list(stages)
+        self.sizes = {}
+        self.done = {}
+        self.current = None
+        self.current_started = None
+        self.started = time.monotonic()
+        self.anomalies = []
+        self._last_percent = 0
+        self._lock = threading.Lock()
+
+    def start(self, stage, size=None):
+        with self._lock:
+            if stage not in self.stages:
+                self.stages.append(stage)
+            self.current = stage
+            self.current_started = time.monotonic()
+            if size:
+                self.sizes[stage] = size
+        print(f'{stage} started, about {self.remaining():.0f}s remaining')
+        self.notify()
+
+    def finish(self, stage, size=None, record=True):
+        """Mark a stage as done; failed stages should pass ``record=False`` to stay out of the history."""
+        with self._lock:
+            seconds = time.monotonic() - self.current_started if self.current == stage else 0.0
+            size = size or self.sizes.get(stage)
+            if record:
+                self._check_anomaly(stage, seconds)
+                self.history.add(stage, seconds, size)
+            self.done[stage] = seconds
+            if self.current == stage:
+                self.current = None
+        self.notify()
+
+    def record(self, stage, seconds, size=None):
+        """Add a stage timed elsewhere (e.g. a report parsed in the background) to the history, without affecting progress."""
+        with self._lock:
+            self.history.add(stage, seconds, size)
+
+    def skip(self, stage):
+        """Mark a stage that does not need to run (e.g. a report already downloaded)."""
+        with self._lock:
+            self.done[stage] = 0.0
+        self.notify()
+
+    def _check_anomaly(self, stage, seconds):
+        runs, mean, std, _ = self.history.model(stage)
+        if runs < ANOMALY_MIN_RUNS or mean is None:
+            return
+        if seconds > mean + ANOMALY_SIGMAS * max(std, 0.1 * mean) and seconds > max(1.5 * mean, mean + ANOMALY_MIN_EXTRA_SECONDS):
+            self.anomalies.append({'stage': stage, 'seconds': round(seconds, 1), 'usual': round(mean, 1)})
+            print(f'Slow stage: {stage} took {seconds:.1f}s (usually {mean:.1f}s)')
+
+    def remaining(self):
+        """Return the estimated seconds left in the run."""
+        with self._lock:
+            remaining = 0.0
+            for stage in self.stages:
+                if stage in self.done:
+                    continue
+                predicted = self.history.predict(stage, self.sizes.get(stage))
+                if stage == self.current:
+                    # A stage running longer than predicted is assumed to be nearly done
+                    predicted = max(predicted - (time.monotonic() - self.current_started), 0.1 * predicted)
+                remaining += predicted
+            return remaining
+
+    def progress(self):
+        """Return (percent, remaining seconds), the percent being the share of the expected total time elapsed."""
+        remaining = self.remaining()
+        elapsed = time.monotonic() - self.started
+        total = elapsed + remaining
+        percent = int(100 * elapsed / total) if total > 0 else 100
+        return min(percent, 99 if remaining > 0 else 100), remaining
+
+    def notify(self):
+        if self.on_update:
+            percent, remaining = self.progress()
+            # The bar never moves backwards, even when a stage overruns its estimate
+            self._last_percent = max(self._last_percent, percent)
+            self.on_update(self._last_percent, remaining)
+
+    async def tick(self, interval=1.0):
+        """Refresh the progress and ETA periodically while a stage runs; cancel the task to stop."""
+        while True:
+            await asyncio.sleep(interval)
+            self.notify()
+
+    def close(self):
+        """
+        Record the whole run in the history and save it.
+
+        Returns:
+            list: The stages (and possibly the 'total' run) that were anomalously slow compared with history.
+        """
+        with self._lock:
+            total = time.monotonic() - self.started
+            if self.done and all(stage in self.done for stage in self.stages):
+                self._check_anomaly('total', total)
+                self.history.add('total', total)
+        self.history.save()
+        return self.anomalies
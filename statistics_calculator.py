@@ -1,39 +1,41 @@
 import pandas as pd
 import asyncio
 
-async def calculate_statistics(df):
-    if df.empty:
-        return "<p style='color: red; text-align: right;'>אין נתונים לחישוב סטטיסטיקה.</p>"
+# Columns set to 'V' for a lead; a person has the mark when any of their leads has it
+MARK_COLUMNS = ['עשו ניסיון', 'יש מנוי']
 
-    await asyncio.sleep(1)
-    # Enhanced CSS for better table readability with visible borders
-    css = """
-    <style>
-        table {
-            width: 100%;
-            border-collapse: collapse;
-            text-align: center;
-            border: 1px solid black; /* Adds a border around the table */
-            margin-bottom: 20px; /* Adds spacing after the table */
-        }
-        th, td {
-            padding: 8px;
-            border: 1px solid white; /* Adds visible borders for table cells */
-            vertical-align: middle; /* Ensures text is centered vertically in cells */
-            text-align: center;
-        }
-        tr:nth-child(even) {
-            background-color: #f2f2f2; /* Alternating row colors for better readability */
-        }
-        tr:hover {
-            background-color: #f5f5f5; /* Optional: highlights row on hover */
-        }
-        h2 {
-            
-            margin: 10px 0 10px 20px; /* Adds space above and below the heading */
-        }
-    </style>
+
+def one_row_per_person(df):
+    """
+    Collapse leads linked by identity resolution ('Cluster ID') into one row per person, so a person who
+    registered twice is counted once.
+
+    The person keeps the values of their earliest lead where it has them (the first source they came
+    from) and has a mark when any of their leads has it.
+    """
+    if 'Cluster ID' not in df.columns or df['Cluster ID'].nunique() == len(df):
+        return df
+    if 'נוצר בתאריך' in df.columns:
+        df = df.sort_values('נוצר בתאריך', kind='stable', na_position='last')
+    aggregations = {col: 'first' for col in df.columns if col != 'Cluster ID'}
+    for col in MARK_COLUMNS:
+        if col in aggregations:
+            aggregations[col] = lambda marks: 'V' if marks.eq('V').any() else ''
+    return df.groupby('Cluster ID', sort=False).agg(aggregations).reset_index()
+
+
+def statistics_tables(df):
+    """
+    Calculate the summary statistics of the merged leads, counting each person ('Cluster ID') once.
+
+    Args:
+        df (DataFrame): The merged leads, as produced by merge_csv_files.
+
+    Returns:
+        dict: DataFrames under 'sources', 'source_summary', 'trials_by_source', 'subscriptions' and 'coaches',
+        and the values 'did_trial', 'did_trial_and_members', 'trial_success_rate' and 'mean_age'.
     """
+    df = one_row_per_person(df)
 
     # Source effectiveness calculation
     # Calculate source effectiveness and quantity
@@ -55,10 +57,6 @@ async def calculate_statistics(df):
     })
     source_effectiveness = pd.concat([source_effectiveness, total_row], ignore_index=True)
 
-    # Generate HTML table with the DataFrame
-    source_html = source_effectiveness.to_html(index=False, header=True, border=0, escape=False)
-
-
     # Subscription types calculation
     filtered_df = df[df['מנוי'].isin(['ללא', 'מנוי פריסייל']) == False]
     subscription_types = filtered_df['מנוי'].value_counts().reset_index(name='כמות')
@@ -75,12 +73,10 @@ async def calculate_statistics(df):
     })
     subscription_types = pd.concat([subscription_types, total_row], ignore_index=True)
 
-    # Generate HTML table
-    subscriptions_html = subscription_types.to_html(index=False, header=True, border=0)
-    subscriptions_html = subscriptions_html.replace('<table>', "<table>")
     
 
     # Trial success rate calculation
+    did_trial = did_trial_and_members = 0
     if df['עשו ניסיון'].eq('V').sum() > 0:
         did_trial = df['עשו ניסיון'].eq('V').sum()
         did_trial_and_members = (df[(df['עשו ניסיון'] == 'V') & df['מנוי'].notna() & (df['מנוי'] != 'ללא')].shape[0])
@@ -118,8 +114,6 @@ async def calculate_statistics(df):
     })
     trial_summary = pd.concat([trial_summary, total_row], ignore_index=True)
 
-    # Generate HTML table with the DataFrame
-    trial_by_source_html = trial_summary.to_html(index=False, header=True, border=0, escape=False)
     
 
     # Calculate coaches count and subscription closures
@@ -151,17 +145,12 @@ async def calculate_statistics(df):
     })
     coaches_count = pd.concat([coaches_count, total_row], ignore_index=True)
 
-    # Generate HTML table
-    coaches_html = coaches_count.to_html(index=False, header=True, border=0, escape=False)
-
-
     # TODO - table with for each month from the col df['תאריך סיום'] and df['מנוי'] == 'ללא' count the number of leads for each month
     # df['תאריך סיום'] = pd.to_datetime(df['תאריך סיום'], errors='coerce')
     # filtered_df = df[df['מנוי'] == 'ללא']
 
     # monthly_leads = filtered_df.groupby(filtered_df['תאריך סיום'].dt.to_period('M')).size().reset_index(name='כמות מנויים שנטשו')
     # monthly_leads.columns = ['חודש', 'כמות מנויים שנטשו']
-    # monthly_leads_html = monthly_leads.to_html(index=False, border=0)
     
     # TODO - table for each 'מקור' how much quantity come from and from each quantity, how much 'יש מנוי' == 'V' and add total row
     
@@ -183,11 +172,68 @@ async def calculate_statistics(df):
     source_summary = pd.concat([source_summary, total_row])
     source_summary.reset_index(inplace=True)
     source_summary.rename(columns={'index': 'מקור'}, inplace=True)
-    source_summary_html = source_summary.to_html(index=False, header=True, border=0, escape=False)
-
 
     age_distribution = df['גיל'].mean()
 
+
+    return {
+        'sources': source_effectiveness,
+        'source_summary': source_summary,
+        'trials_by_source': trial_summary,
+        'subscriptions': subscription_types,
+        'coaches': coaches_count,
+        'did_trial': int(did_trial),
+        'did_trial_and_members': int(did_trial_and_members),
+        'trial_success_rate': float(trial_success_rate),
+        'mean_age': float(age_distribution),
+    }
+
+
+async def calculate_statistics(df):
+    if df.empty:
+        return "<p style='color: red; text-align: right;'>אין נתונים לחישוב סטטיסטיקה.</p>"
+
+    await asyncio.sleep(1)
+    # Enhanced CSS for better table readability with visible borders
+    css = """
+    <style>
+        table {
+            width: 100%;
+            border-collapse: collapse;
+            text-align: center;
+            border: 1px solid black; /* Adds a border around the table */
+            margin-bottom: 20px; /* Adds spacing after the table */
+        }
+        th, td {
+            padding: 8px;
+            border: 1px solid white; /* Adds visible borders for table cells */
+            vertical-align: middle; /* Ensures text is centered vertically in cells */
+            text-align: center;
+        }
+        tr:nth-child(even) {
+            background-color: #f2f2f2; /* Alternating row colors for better readability */
+        }
+        tr:hover {
+            background-color: #f5f5f5; /* Optional: highlights row on hover */
+        }
+        h2 {
+            
+            margin: 10px 0 10px 20px; /* Adds space above and below the heading */
+        }
+    </style>
+    """
+
+    tables = statistics_tables(df)
+    source_html = tables['sources'].to_html(index=False, header=True, border=0, escape=False)
+    source_summary_html = tables['source_summary'].to_html(index=False, header=True, border=0, escape=False)
+    trial_by_source_html = tables['trials_by_source'].to_html(index=False, header=True, border=0, escape=False)
+    subscriptions_html = tables['subscriptions'].to_html(index=False, header=True, border=0)
+    coaches_html = tables['coaches'].to_html(index=False, header=True, border=0, escape=False)
+    did_trial = tables['did_trial']
+    did_trial_and_members = tables['did_trial_and_members']
+    trial_success_rate = tables['trial_success_rate']
+    age_distribution = tables['mean_age']
+
     # Combine all HTML parts with the CSS header
     stats = f"{css}<div><h2>אחוזי קליטה עבור כל מקור: </h2>{source_html}</div>" \
             f"<div><h2>מספר לידים עבור כל מקור וסגירת מנויים עבור כל מקור: </h2>{source_summary_html}</div>" \